@@ -1,11 +1,42 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import subprocess
 import json
+import logging
 import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict
+
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+
+from job_queue import JobQueue, QueueFull
+from pipeline import AnalysisPipeline
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Build the pipeline once so every request reuses the same
+    LLM gateway, Reddit client and VectorStore; stop the job
+    queue on shutdown.
+    """
+    app.state.pipeline = AnalysisPipeline()
+    app.state.jobs = JobQueue(
+        app.state.pipeline.run,
+        workers=int(os.getenv("JOB_WORKERS", "2")),
+        max_queued=int(os.getenv("JOB_QUEUE_LIMIT", "16")),
+        ttl=float(os.getenv("JOB_TTL", "3600")),
+    )
+    try:
+        yield
+    finally:
+        app.state.jobs.shutdown()
 
-app = FastAPI(title="Reddit Insight Engine")
+
+app = FastAPI(title="Reddit Insight Engine", lifespan=lifespan)
 
 # Allow frontend (Vite / React)
 app.add_middleware(
@@ -34,32 +65,96 @@ def analyze(req: AnalyzeRequest):
     3. Run analysis agent
     4. Return insights
     """
+    return app.state.pipeline.run(req.query)
 
-    # ---------------- Step 1: Query → Research Plan ---------------- #
 
-    subprocess.run(
-        ["python", "query_planner_agent.py", req.query],
-        check=True
-    )
-    # This generates: ex.json
+STREAM_MEDIA_TYPES = {
+    "sse": "text/event-stream",
+    "ndjson": "application/x-ndjson",
+}
 
-    # ---------------- Step 2: Reddit Ingestion ---------------- #
 
-    subprocess.run(
-        ["python", "main.py", "ex.json"],
-        check=True
-    )
-    # This generates: ingestion_output.json
+def format_event(event: Dict[str, Any], fmt: str) -> str:
+    if fmt == "sse":
+        return f"event: {event['event']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+    return json.dumps(event, ensure_ascii=False) + "\n"
 
-    # ---------------- Step 3: Analysis Agent ---------------- #
 
-    result = subprocess.run(
-        ["python", "reddit_analysis_agent.py", "ingestion_output.json"],
-        capture_output=True,
-        text=True,
-        check=True
-    )
+async def stream_events(request: Request, query: str, fmt: str) -> AsyncIterator[str]:
+    """
+    Serialize pipeline events, pulling each one in the threadpool.
+
+    Stops at the next event once the client disconnects (or when
+    Starlette cancels the response) and closes the pipeline stream,
+    which cancels searches, comment fetches and map calls not yet
+    started (see AnalysisPipeline.stream).
+    """
+    events = app.state.pipeline.stream(query)
+    try:
+        while not await request.is_disconnected():
+            try:
+                event = await run_in_threadpool(next, events, None)
+            except Exception as e:
+                logger.exception("Streaming analysis failed")
+                yield format_event({"event": "error", "error": str(e)}, fmt)
+                return
+            if event is None:
+                return
+            yield format_event(event, fmt)
+
+        logger.info("Client disconnected, stopping analysis stream")
+    finally:
+        # run_in_threadpool waits for next() on cancellation, so the generator is idle here
+        events.close()
+
+
+@app.post("/jobs", status_code=202)
+def create_job(req: AnalyzeRequest):
+    """
+    Queue a full pipeline run and return its job id at once.
+
+    An identical query already queued or running returns that job
+    ("deduplicated": true). Returns 429 when the queue is full.
+    """
+    try:
+        job, created = app.state.jobs.submit(req.query)
+    except QueueFull as e:
+        return JSONResponse(
+            status_code=429,
+            content={"detail": f"Job queue full: {e}"},
+            headers={"Retry-After": "30"},
+        )
+
+    return {"job_id": job.id, "status": job.status, "deduplicated": not created}
+
 
-    # ---------------- Step 4: Return JSON ---------------- #
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """
+    Poll a job. "result" is set once "status" is "done"; failed jobs
+    carry "error". Finished jobs expire after JOB_TTL seconds.
+    """
+    job = app.state.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job.to_dict()
+
+
+@app.post("/analyze/stream")
+def analyze_stream(req: AnalyzeRequest, request: Request, fmt: str = Query("sse", alias="format")):
+    """
+    Streaming variant of /analyze (see AnalysisPipeline.stream).
+
+    Emits the research plan, one "post" event per ingested post with
+    per-subreddit progress, one "chunk" event with partial themes per
+    finished map call, and a final "result" event. `format` is "sse"
+    (Server-Sent Events) or "ndjson" (one JSON object per line).
+    """
+    if fmt not in STREAM_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"format must be one of {sorted(STREAM_MEDIA_TYPES)}")
 
-    return json.loads(result.stdout)
+    return StreamingResponse(
+        stream_events(request, req.query, fmt),
+        media_type=STREAM_MEDIA_TYPES[fmt],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,764 @@
+"""
+Latency benchmarks for the research pipeline.
+
+Usage:
+    python benchmark.py pipeline "<user query>" [--runs N]
+    python benchmark.py concurrency [--requests N] [--latency SECONDS]
+    python benchmark.py fetch [--workers 1 2 4 8] [--latency SECONDS]
+    python benchmark.py handshake [--calls N]
+    python benchmark.py comments [--width N] [--depth N] [--fixture comments.json ...]
+    python benchmark.py backends [--sizes 100 1000 10000] [--dim N] [--queries N]
+    python benchmark.py mmr [--themes N] [--copies N] [--lambdas 1.0 0.7 0.5]
+    python benchmark.py packing [--items N] [--budget TOKENS]
+    python benchmark.py mapreduce [--docs N] [--concurrency 1 4 8] [--latency SECONDS]
+    python benchmark.py cluster [--docs N] [--latency SECONDS]
+    python benchmark.py plancache [--latency SECONDS] [--threshold SIMILARITY]
+    python benchmark.py streaming [--keywords N] [--latency SECONDS] [--llm-latency SECONDS]
+    python benchmark.py sse [--format sse|ndjson] [--latency SECONDS] [--cancel-after N]
+    python benchmark.py jobs [--requests N] [--distinct N] [--workers N] [--queue N]
+    python benchmark.py gateway [--calls N] [--concurrency N] [--fail-first N]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+
+# ---------------- HELPERS ---------------- #
+
+def time_runs(fn: Callable[[], object], runs: int) -> List[float]:
+    """Call `fn` `runs` times and return wall-clock seconds per call."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(label: str, timings: List[float]) -> None:
+    print(
+        f"{label:<28} runs={len(timings):<3} "
+        f"mean={statistics.mean(timings):8.3f}s  "
+        f"min={min(timings):8.3f}s  max={max(timings):8.3f}s"
+    )
+
+
+# ---------------- BENCHMARKS ---------------- #
+
+def bench_pipeline(args: argparse.Namespace) -> None:
+    """Compare the legacy three-subprocess path with the in-process pipeline."""
+
+    def subprocess_path():
+        subprocess.run([sys.executable, "query_planner_agent.py", args.query], check=True)
+        subprocess.run([sys.executable, "main.py", "ex.json"], check=True)
+        subprocess.run(
+            [sys.executable, "reddit_analysis_agent.py", "ingestion_output.json"],
+            capture_output=True,
+            check=True,
+        )
+
+    report("subprocess pipeline", time_runs(subprocess_path, args.runs))
+
+    start = time.perf_counter()
+    from pipeline import AnalysisPipeline
+    pipeline = AnalysisPipeline()
+    report("in-process startup (once)", [time.perf_counter() - start])
+
+    report("in-process pipeline", time_runs(lambda: pipeline.run(args.query), args.runs))
+
+
+def bench_concurrency(args: argparse.Namespace) -> None:
+    """Fire N overlapping pipeline runs offline and check results never mix."""
+    from concurrent.futures import ThreadPoolExecutor
+    from main import RedditIngestionService
+    from stubs import HashingVectorStore, StubPipeline, StubRedditClient
+
+    pipeline = StubPipeline(RedditIngestionService(
+        reddit_client=StubRedditClient(latency=args.latency),
+        vector_store=HashingVectorStore(),
+    ))
+    queries = [f"topic{i}" for i in range(args.requests)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.requests) as pool:
+        results = list(pool.map(pipeline.run, queries))
+    report(f"{args.requests} overlapping requests", [time.perf_counter() - start])
+
+    mixed = 0
+    for query, result in zip(queries, results):
+        own = set(result["post_ids"])
+        for doc in result["documents"]:
+            if doc[1:11] not in own:
+                mixed += 1
+                print(f"MIXED: request '{query}' got foreign document {doc!r}")
+
+    if mixed:
+        sys.exit(f"FAIL: {mixed} documents leaked across requests")
+    print(f"OK: {sum(len(r['documents']) for r in results)} documents, none mixed")
+
+
+def bench_fetch(args: argparse.Namespace) -> None:
+    """Ingestion fetch wall-clock against a local stub Reddit server, per worker count."""
+    from main import RedditIngestionService
+    from rate_limiter import RateLimiter
+    from reddit_client import RedditClient
+    from stubs import HashingVectorStore, StubRedditServer, stub_plan
+
+    plan = stub_plan("benchmark")
+    plan["keywords"] = [f"keyword {i}" for i in range(args.keywords)]
+    plan["target_subreddits"] = [f"sub{i}" for i in range(args.subreddits)]
+
+    with StubRedditServer(latency=args.latency) as server:
+        # Effectively unlimited so the benchmark measures fetch concurrency
+        client = RedditClient(
+            base_url=server.url,
+            rate_limiter=RateLimiter(requests_per_minute=600000, burst=1000),
+            pool_size=max(args.workers),
+            use_cache=False,
+        )
+        searches = [
+            (keyword, subreddit)
+            for keyword in plan["keywords"]
+            for subreddit in plan["target_subreddits"]
+        ]
+        baseline = None
+        for workers in args.workers:
+            service = RedditIngestionService(
+                reddit_client=client,
+                vector_store=HashingVectorStore(),
+                max_workers=workers,
+            )
+            start = time.perf_counter()
+            service._fetch_all(searches, plan["posts_limit_per_subreddit"])
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            report(f"workers={workers} (x{baseline / elapsed:4.1f})", [elapsed])
+
+        print(f"stub server handled {server.request_count} requests")
+
+
+def make_self_signed_cert(directory: str) -> tuple:
+    """Create a throwaway certificate for 127.0.0.1 with the openssl CLI."""
+    certfile = os.path.join(directory, "cert.pem")
+    keyfile = os.path.join(directory, "key.pem")
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+            "-keyout", keyfile, "-out", certfile, "-days", "1",
+            "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1",
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return certfile, keyfile
+
+
+def bench_handshake(args: argparse.Namespace) -> None:
+    """Bare requests.get vs the pooled keep-alive session against a local HTTPS stub."""
+    import requests
+    from http_session import build_session
+    from stubs import StubRedditServer
+
+    with tempfile.TemporaryDirectory() as tmp:
+        certfile, keyfile = make_self_signed_cert(tmp)
+
+        with StubRedditServer(certfile=certfile, keyfile=keyfile) as server:
+            url = f"{server.url}/r/bench/search.json"
+            params = {"q": "handshake", "limit": 5}
+
+            def bare():
+                for _ in range(args.calls):
+                    requests.get(url, params=params, verify=certfile, timeout=10).json()
+
+            report(f"bare requests.get x{args.calls}", time_runs(bare, 1))
+            bare_connections = server.connection_count
+
+            session = build_session()
+
+            def pooled():
+                for _ in range(args.calls):
+                    # Per-call verify: REQUESTS_CA_BUNDLE would override session.verify
+                    session.get(url, params=params, verify=certfile, timeout=10).json()
+
+            report(f"pooled session x{args.calls}", time_runs(pooled, 1))
+            print(
+                f"TLS connections opened: bare={bare_connections}, "
+                f"pooled={server.connection_count - bare_connections}"
+            )
+
+
+def synthetic_comment_tree(width: int, depth: int, extra_fields: int = 40) -> List[Dict[str, Any]]:
+    """
+    Reddit-shaped reply tree: `width` top-level comments, each the head of
+    a reply chain `depth` deep. Every comment carries `extra_fields` filler
+    keys to mimic the size of real Reddit comment payloads.
+    """
+    filler = {f"field_{i}": f"value {i}" for i in range(extra_fields)}
+    tree = []
+    for w in range(width):
+        # Build the chain bottom-up so deep trees don't need recursion here
+        replies = ""
+        for d in reversed(range(depth)):
+            data = dict(filler, id=f"c{w}_{d}", body=f"comment {w}.{d} " * 8, score=(w * 7 + d * 13) % 997, depth=d)
+            data["replies"] = replies
+            replies = {"kind": "Listing", "data": {"children": [{"kind": "t1", "data": data}]}}
+        tree.extend(replies["data"]["children"])
+    return tree
+
+
+def legacy_extract(tree: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """The previous recursive extractor, kept here for comparison."""
+    comments = []
+    for item in tree:
+        if item["kind"] == "t1":
+            comment_data = item["data"]
+            comments.append(comment_data)
+            if isinstance(comment_data.get("replies"), dict):
+                comments.extend(legacy_extract(comment_data["replies"]["data"]["children"]))
+    return comments
+
+
+def measure(fn: Callable[[], object]) -> tuple:
+    """Return (seconds, peak traced bytes) for one call of `fn`."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        fn()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def bench_comments(args: argparse.Namespace) -> None:
+    """Recursive list extraction + full sort vs streaming extraction into the ranker."""
+    from comment_ranker import CommentRanker
+    from reddit_client import RedditClient
+
+    trees = []
+    for path in args.fixture:
+        with open(path, "r", encoding="utf-8") as f:
+            trees.append((os.path.basename(path), json.load(f)[1]["data"]["children"]))
+    if not trees:
+        trees.append((f"synthetic {args.width}x{args.depth}", synthetic_comment_tree(args.width, args.depth)))
+        trees.append((f"synthetic 1x{args.deep}", synthetic_comment_tree(1, args.deep)))
+
+    for name, tree in trees:
+        print(f"-- {name}")
+
+        def legacy():
+            comments = legacy_extract(tree)
+            valid = [c for c in comments if CommentRanker().is_valid_comment(c)]
+            valid.sort(key=lambda c: c.get("score", 0), reverse=True)
+            return valid[:args.top_n]
+
+        def streaming():
+            return CommentRanker(top_n=args.top_n).rank_comments(RedditClient._extract_comments(tree))
+
+        for label, fn in (("recursive + sort", legacy), ("streaming + ranker", streaming)):
+            try:
+                elapsed, peak = measure(fn)
+                print(f"{label:<20} time={elapsed * 1000:9.1f}ms  peak={peak / 1024:10.1f}KiB")
+            except RecursionError:
+                print(f"{label:<20} RecursionError")
+
+
+def bench_backends(args: argparse.Namespace) -> None:
+    """Chroma vs exact NumPy search: start-up, insert and query time by corpus size."""
+    import numpy as np
+
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import chromadb"], check=True)
+    cold_import = time.perf_counter() - start
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import numpy"], check=True)
+    cold_import -= time.perf_counter() - start
+    print(f"chromadb import (cold, beyond numpy): {cold_import * 1000:.0f}ms")
+
+    from vector_backends import ChromaBackend, NumpyBackend
+
+    rng = np.random.default_rng(0)
+    for size in args.sizes:
+        # Unit vectors, so Chroma's L2 ranking matches NumPy's cosine ranking
+        vectors = rng.standard_normal((size, args.dim), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+        ids = [f"doc:{i}" for i in range(size)]
+        metadatas = [{"post_id": str(i % 50)} for i in range(size)]
+        print(f"-- {size} vectors x {args.dim} dims")
+
+        hits = {}
+        for name, factory in (
+            ("numpy", lambda: NumpyBackend()),
+            ("chroma", lambda: ChromaBackend(f"bench_{size}")),
+        ):
+            start = time.perf_counter()
+            backend = factory()
+            opened = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for s in range(0, size, 1000):
+                backend.upsert(ids[s:s + 1000], ids[s:s + 1000], vectors[s:s + 1000], metadatas[s:s + 1000])
+            inserted = time.perf_counter() - start
+
+            start = time.perf_counter()
+            hits[name] = [
+                backend.query([q.tolist()], n_results=args.k)["ids"][0] for q in queries
+            ]
+            per_query = (time.perf_counter() - start) / len(queries)
+            print(
+                f"{name:<8} open={opened * 1000:8.1f}ms  insert={inserted * 1000:9.1f}ms  "
+                f"query={per_query * 1000:7.3f}ms  total={(opened + inserted + per_query) * 1000:9.1f}ms"
+            )
+
+        overlap = statistics.mean(
+            len(set(a) & set(b)) / len(a) for a, b in zip(hits["numpy"], hits["chroma"])
+        )
+        print(f"chroma recall@{args.k} vs exact: {overlap:.3f}")
+
+
+def bench_mmr(args: argparse.Namespace) -> None:
+    """Distinct themes in the retrieved top-k, plain nearest neighbours vs MMR."""
+    from stubs import HashingVectorStore
+
+    store = HashingVectorStore(backend="numpy")
+    texts, metadatas, ids = [], [], []
+    for theme in range(args.themes):
+        for copy in range(args.copies):
+            # Near-duplicates: same complaint, one varying word
+            texts.append(f"delivery complaint theme{theme} word{theme}a word{theme}b variant{copy}")
+            metadatas.append({"post_id": f"p{theme}", "theme": theme})
+            ids.append(f"comment:{theme}-{copy}")
+    store.add_many(texts, metadatas, ids=ids)
+    store.flush()
+
+    for lambda_mult in args.lambdas:
+        start = time.perf_counter()
+        results = store.search_mmr(
+            "delivery complaint", k=args.k, fetch_k=args.fetch_k, lambda_mult=lambda_mult
+        )
+        elapsed = time.perf_counter() - start
+        themes = {meta["theme"] for meta in results["metadatas"][0]}
+        chars = sum(len(doc) for doc in results["documents"][0])
+        print(
+            f"lambda={lambda_mult:<4} distinct themes={len(themes):>2}/{args.k}  "
+            f"chars={chars:>5}  time={elapsed * 1000:6.2f}ms"
+        )
+
+
+def bench_packing(args: argparse.Namespace) -> None:
+    """Items and tokens fitted by the old 8000-char cut-off vs the token packer."""
+    import random
+    from prompt_packer import estimate_tokens, pack
+
+    rng = random.Random(0)
+    # Mostly short comments with the occasional wall of text, like real threads
+    texts = [
+        " ".join(f"word{rng.randint(0, 999)}" for _ in range(rng.choice([8, 15, 30, 60, 600])))
+        for _ in range(args.items)
+    ]
+
+    joined, total = [], 0
+    for t in texts:
+        if total + len(t) > 8000:
+            break
+        joined.append(f"- {t}")
+        total += len(t)
+    legacy_tokens = estimate_tokens("\n".join(joined))
+    print(f"{'char cut-off (legacy)':<22} items={len(joined):>3}  tokens={legacy_tokens:>5} (untracked)")
+
+    packed = pack(texts, args.budget, max_item_tokens=args.item_tokens)
+    print(f"{'token packer':<22} items={len(packed.items):>3}  tokens={packed.tokens_used:>5}/{args.budget}  "
+          f"truncated={packed.truncated} dropped={packed.dropped}")
+
+
+THEME_WORDS = {
+    "shipping": "delivery late courier parcel tracking",
+    "pricing": "expensive cost price discount fee",
+    "support": "agent reply ticket helpdesk phone",
+    "quality": "broke defect cheap material flimsy",
+    "returns": "refund exchange policy receipt label",
+}
+
+
+def analysis_corpus(docs: int) -> tuple:
+    """Offline store with `docs` comments over five known themes, plus a matching ingestion output."""
+    import random
+    from stubs import HashingVectorStore
+
+    rng = random.Random(0)
+    themes = list(THEME_WORDS)
+    store = HashingVectorStore(backend="numpy")
+    texts, truth = [], {}
+    for i in range(docs):
+        theme = themes[i % len(themes)] if i % 7 else themes[0]
+        words = THEME_WORDS[theme].split()
+        texts.append(f"{theme} " + " ".join(rng.choice(words) for _ in range(rng.randint(3, 30))))
+        truth[theme] = truth.get(theme, 0) + 1
+    store.add_many(
+        texts,
+        [{"post_id": f"p{i % 20}"} for i in range(docs)],
+        ids=[f"comment:{i}" for i in range(docs)],
+    )
+    ingestion_output = {
+        "query": ["complaint"],
+        "results": [{"posts": [{"id": f"p{i}"} for i in range(20)]}],
+    }
+    return store, ingestion_output, truth
+
+
+def bench_mapreduce(args: argparse.Namespace) -> None:
+    """Single-prompt vs map-reduce analysis coverage and latency with a fake LLM."""
+    from reddit_analysis_agent import run_analysis
+    from stubs import FakeLLM
+
+    store, ingestion_output, _ = analysis_corpus(args.docs)
+
+    runs = [("single", 1)] + [("map_reduce", c) for c in args.concurrency]
+    for mode, concurrency in runs:
+        llm = FakeLLM(latency=args.latency)
+        start = time.perf_counter()
+        result = run_analysis(
+            ingestion_output, store=store, mode=mode, llm=llm, max_concurrency=concurrency
+        )
+        elapsed = time.perf_counter() - start
+        evidence = sum(t["evidence_count"] for t in result["themes"])
+        print(
+            f"{mode:<10} concurrency={concurrency:<2} time={elapsed:6.2f}s  calls={llm.calls:<3} "
+            f"peak in flight={llm.max_in_flight:<2} themes={len(result['themes'])}  "
+            f"evidence={evidence}/{args.docs}"
+        )
+
+
+def bench_cluster(args: argparse.Namespace) -> None:
+    """evidence_count accuracy and LLM input size: map-reduce vs local clustering."""
+    from reddit_analysis_agent import run_analysis
+    from stubs import FakeLLM
+
+    store, ingestion_output, truth = analysis_corpus(args.docs)
+    print(f"{'truth':<10} {dict(sorted(truth.items()))}")
+
+    for mode in ("map_reduce", "cluster"):
+        llm = FakeLLM(latency=args.latency)
+        start = time.perf_counter()
+        result = run_analysis(ingestion_output, store=store, mode=mode, llm=llm)
+        elapsed = time.perf_counter() - start
+        counts = {t["theme"]: t["evidence_count"] for t in result["themes"]}
+        error = sum(abs(counts.get(theme, 0) - n) for theme, n in truth.items())
+        print(
+            f"{mode:<10} time={elapsed:6.2f}s  calls={llm.calls:<3} prompt tokens={llm.prompt_tokens:<6} "
+            f"count error={error}  {dict(sorted(counts.items()))}"
+        )
+
+
+def bench_plancache(args: argparse.Namespace) -> None:
+    """Planning latency for cold, repeated and rephrased queries through the plan cache."""
+    from plan_cache import PlanCache
+    from stubs import HashingVectorStore, stub_plan
+
+    def slow_planner(query):
+        time.sleep(args.latency)
+        return stub_plan(query)
+
+    store = HashingVectorStore(backend="numpy")
+    cache = PlanCache(similarity_threshold=args.threshold, embed=store.embed)
+
+    queries = [
+        ("cold", "demand for vegan bakery in pune"),
+        ("cold", "complaints about food delivery apps"),
+        ("repeat", "demand for vegan bakery in pune"),
+        ("repeat", "  Demand for Vegan Bakery in Pune? "),
+        ("rephrased", "pune vegan bakery demand"),
+        ("rephrased", "complaints about food delivery apps in general"),
+        ("unrelated", "used bike prices in delhi"),
+    ]
+    for kind, query in queries:
+        start = time.perf_counter()
+        cache.get_or_create(query, slow_planner)
+        elapsed = time.perf_counter() - start
+        print(f"{kind:<10} {elapsed * 1000:8.2f}ms  {query!r}")
+
+    print(cache.stats())
+
+
+def bench_streaming(args: argparse.Namespace) -> None:
+    """Sequential plan -> ingest -> map-reduce vs the overlapped streaming pipeline."""
+    # Small chunks so a stub-sized corpus spans many map calls; set before the imports read it
+    os.environ["PROMPT_TOKEN_BUDGET"] = str(args.chunk_tokens)
+    from main import RedditIngestionService
+    from pipeline import AnalysisPipeline
+    from stubs import FakeLLM, HashingVectorStore, StubRedditClient, stub_plan
+
+    plan = stub_plan("benchmark")
+    plan["keywords"] = [f"keyword {i}" for i in range(args.keywords)]
+    plan["target_subreddits"] = [f"sub{i}" for i in range(args.subreddits)]
+
+    class PlannedPipeline(AnalysisPipeline):
+        def plan(self, query):
+            return dict(plan)
+
+    for label in ("sequential", "streaming"):
+        llm = FakeLLM(latency=args.llm_latency)
+        pipeline = PlannedPipeline(
+            RedditIngestionService(
+                reddit_client=StubRedditClient(latency=args.latency),
+                vector_store=HashingVectorStore(backend="numpy"),
+                max_workers=args.workers,
+            ),
+            analysis_mode="map_reduce",
+            llm=llm,
+        )
+        start = time.perf_counter()
+        if label == "sequential":
+            result = pipeline.run("benchmark")
+        else:
+            result = pipeline.run_streaming("benchmark", max_concurrency=args.concurrency)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{label:<11} time={elapsed:6.2f}s  llm calls={llm.calls:<3} "
+            f"peak in flight={llm.max_in_flight:<2} themes={len(result['themes'])}"
+        )
+
+
+def bench_sse(args: argparse.Namespace) -> None:
+    """Time to first event vs full response for /analyze and /analyze/stream, offline."""
+    import threading
+    import requests
+    import uvicorn
+    import backend_api
+    from main import RedditIngestionService
+    from pipeline import AnalysisPipeline
+    from stubs import FakeLLM, HashingVectorStore, StubPipeline, StubRedditClient
+
+    class FakeLLMPipeline(StubPipeline):
+        # Stub plan, but the real analysis path (with the fake LLM) for /analyze
+        analyze = AnalysisPipeline.analyze
+
+    client = StubRedditClient(latency=args.latency)
+    backend_api.app.state.pipeline = FakeLLMPipeline(
+        RedditIngestionService(reddit_client=client, vector_store=HashingVectorStore(backend="numpy")),
+        analysis_mode="map_reduce",
+        llm=FakeLLM(latency=args.llm_latency),
+    )
+
+    # Startup hooks are skipped so the stub pipeline above stays in place
+    config = uvicorn.Config(backend_api.app, host="127.0.0.1", port=0, log_level="warning", lifespan="off")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    base = f"http://127.0.0.1:{server.servers[0].sockets[0].getsockname()[1]}"
+
+    try:
+        start = time.perf_counter()
+        requests.post(f"{base}/analyze", json={"query": "blocking"}).raise_for_status()
+        print(f"{'/analyze':<24} first byte={time.perf_counter() - start:6.2f}s")
+
+        start = time.perf_counter()
+        with requests.post(
+            f"{base}/analyze/stream",
+            params={"format": args.format},
+            json={"query": "stream"},
+            stream=True,
+        ) as response:
+            first, events = None, {}
+            for line in response.iter_lines():
+                if not line or line.startswith(b"event:"):
+                    continue
+                first = first or time.perf_counter() - start
+                event = json.loads(line.split(b"data: ", 1)[-1])
+                events[event["event"]] = events.get(event["event"], 0) + 1
+                if args.cancel_after and sum(events.values()) >= args.cancel_after:
+                    break
+        total = time.perf_counter() - start
+        print(f"{'/analyze/stream':<24} first event={first:6.2f}s  total={total:6.2f}s  {events}")
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+def bench_jobs(args: argparse.Namespace) -> None:
+    """Burst of job submissions: accepted, deduplicated and rejected counts, and drain time."""
+    from fastapi.testclient import TestClient
+    import backend_api
+    from job_queue import JobQueue
+    from main import RedditIngestionService
+    from stubs import HashingVectorStore, StubPipeline, StubRedditClient
+
+    pipeline = StubPipeline(RedditIngestionService(
+        reddit_client=StubRedditClient(latency=args.latency),
+        vector_store=HashingVectorStore(backend="numpy"),
+    ))
+    backend_api.app.state.pipeline = pipeline
+    backend_api.app.state.jobs = JobQueue(pipeline.run, workers=args.workers, max_queued=args.queue, ttl=60)
+    client = TestClient(backend_api.app)
+
+    start = time.perf_counter()
+    job_ids, statuses, deduplicated = set(), {}, 0
+    for i in range(args.requests):
+        response = client.post("/jobs", json={"query": f"topic {i % args.distinct}"})
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        if response.status_code == 202:
+            body = response.json()
+            job_ids.add(body["job_id"])
+            deduplicated += body["deduplicated"]
+    submitted = time.perf_counter() - start
+    print(
+        f"{args.requests} submissions in {submitted * 1000:.0f}ms: status codes {statuses}, "
+        f"{len(job_ids)} jobs, {deduplicated} deduplicated"
+    )
+
+    while True:
+        jobs = [client.get(f"/jobs/{job_id}").json() for job_id in job_ids]
+        if all(job["status"] in ("done", "failed") for job in jobs):
+            break
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    failed = sum(job["status"] == "failed" for job in jobs)
+    print(f"all jobs finished after {elapsed:.2f}s ({failed} failed); {backend_api.app.state.jobs.stats()}")
+
+
+def bench_gateway(args: argparse.Namespace) -> None:
+    """Burst of sync and async calls through the LLM gateway on the fake backend."""
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+    from llm_gateway import FakeBackend, LLMGateway
+
+    for label in ("threads", "asyncio"):
+        backend = FakeBackend(latency=args.latency, fail_first=args.fail_first, fail_status=429)
+        gateway = LLMGateway(backend, max_concurrency=args.concurrency, base_delay=0.05)
+        prompts = [f"prompt {i}" for i in range(args.calls)]
+
+        start = time.perf_counter()
+        if label == "threads":
+            with ThreadPoolExecutor(max_workers=args.calls) as pool:
+                list(pool.map(gateway.generate, prompts))
+        else:
+            async def burst():
+                await asyncio.gather(*(gateway.agenerate(p) for p in prompts))
+            asyncio.run(burst())
+        elapsed = time.perf_counter() - start
+
+        floor = args.latency * -(-args.calls // args.concurrency)
+        print(f"{label:<8} time={elapsed:6.2f}s (concurrency floor {floor:.2f}s)  {gateway.stats()}")
+
+
+# ---------------- CLI ENTRY ---------------- #
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    sub = parser.add_subparsers(dest="benchmark", required=True)
+
+    p = sub.add_parser("pipeline", help="subprocess vs in-process /analyze latency")
+    p.add_argument("query")
+    p.add_argument("--runs", type=int, default=3)
+    p.set_defaults(func=bench_pipeline)
+
+    p = sub.add_parser("concurrency", help="overlapping offline requests, checks isolation")
+    p.add_argument("--requests", type=int, default=8)
+    p.add_argument("--latency", type=float, default=0.05)
+    p.set_defaults(func=bench_concurrency)
+
+    p = sub.add_parser("fetch", help="search + comment fetch scaling by worker count")
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    p.add_argument("--latency", type=float, default=0.05)
+    p.add_argument("--keywords", type=int, default=6)
+    p.add_argument("--subreddits", type=int, default=3)
+    p.set_defaults(func=bench_fetch)
+
+    p = sub.add_parser("handshake", help="bare requests vs pooled keep-alive session over HTTPS")
+    p.add_argument("--calls", type=int, default=200)
+    p.set_defaults(func=bench_handshake)
+
+    p = sub.add_parser("comments", help="comment tree extraction time and peak memory")
+    p.add_argument("--width", type=int, default=2000)
+    p.add_argument("--depth", type=int, default=10)
+    p.add_argument("--deep", type=int, default=5000, help="depth of the single deep thread")
+    p.add_argument("--top-n", type=int, default=3)
+    p.add_argument("--fixture", nargs="*", default=[], help="saved comments/{id}.json responses")
+    p.set_defaults(func=bench_comments)
+
+    p = sub.add_parser("backends", help="chroma vs numpy vector backend crossover by corpus size")
+    p.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 50000])
+    p.add_argument("--dim", type=int, default=768)
+    p.add_argument("--queries", type=int, default=50)
+    p.add_argument("-k", type=int, default=10)
+    p.set_defaults(func=bench_backends)
+
+    p = sub.add_parser("mmr", help="distinct evidence in the top-k with and without MMR")
+    p.add_argument("--themes", type=int, default=8)
+    p.add_argument("--copies", type=int, default=10)
+    p.add_argument("--lambdas", type=float, nargs="+", default=[1.0, 0.7, 0.5, 0.3])
+    p.add_argument("-k", type=int, default=10)
+    p.add_argument("--fetch-k", type=int, default=80)
+    p.set_defaults(func=bench_mmr)
+
+    p = sub.add_parser("packing", help="prompt items fitted by char cut-off vs token packer")
+    p.add_argument("--items", type=int, default=40)
+    p.add_argument("--budget", type=int, default=2000)
+    p.add_argument("--item-tokens", type=int, default=300)
+    p.set_defaults(func=bench_packing)
+
+    p = sub.add_parser("mapreduce", help="single-prompt vs map-reduce analysis with a fake LLM")
+    p.add_argument("--docs", type=int, default=1000)
+    p.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    p.add_argument("--latency", type=float, default=0.2, help="seconds per fake LLM call")
+    p.set_defaults(func=bench_mapreduce)
+
+    p = sub.add_parser("cluster", help="evidence_count accuracy: map-reduce vs local clustering")
+    p.add_argument("--docs", type=int, default=1000)
+    p.add_argument("--latency", type=float, default=0.2, help="seconds per fake LLM call")
+    p.set_defaults(func=bench_cluster)
+
+    p = sub.add_parser("plancache", help="planning latency with the two-tier plan cache")
+    p.add_argument("--latency", type=float, default=1.5, help="seconds per fake planner call")
+    p.add_argument("--threshold", type=float, default=0.85)
+    p.set_defaults(func=bench_plancache)
+
+    p = sub.add_parser("streaming", help="sequential vs overlapped streaming pipeline")
+    p.add_argument("--keywords", type=int, default=6)
+    p.add_argument("--subreddits", type=int, default=3)
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--concurrency", type=int, default=4, help="map calls in flight")
+    p.add_argument("--latency", type=float, default=0.1, help="seconds per stub Reddit call")
+    p.add_argument("--llm-latency", type=float, default=0.5, help="seconds per fake LLM call")
+    p.add_argument("--chunk-tokens", type=int, default=200)
+    p.set_defaults(func=bench_streaming)
+
+    p = sub.add_parser("sse", help="time to first event on /analyze/stream with stub Reddit and LLM")
+    p.add_argument("--format", choices=["sse", "ndjson"], default="sse")
+    p.add_argument("--latency", type=float, default=0.1, help="seconds per stub Reddit call")
+    p.add_argument("--llm-latency", type=float, default=0.5, help="seconds per fake LLM call")
+    p.add_argument("--cancel-after", type=int, default=0, help="disconnect after N events")
+    p.set_defaults(func=bench_sse)
+
+    p = sub.add_parser("jobs", help="job API under a burst: dedup, 429s and drain time")
+    p.add_argument("--requests", type=int, default=60)
+    p.add_argument("--distinct", type=int, default=20, help="distinct queries in the burst")
+    p.add_argument("--workers", type=int, default=2)
+    p.add_argument("--queue", type=int, default=8)
+    p.add_argument("--latency", type=float, default=0.05, help="seconds per stub Reddit call")
+    p.set_defaults(func=bench_jobs)
+
+    p = sub.add_parser("gateway", help="LLM gateway concurrency cap, retries and accounting")
+    p.add_argument("--calls", type=int, default=40)
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--latency", type=float, default=0.1, help="seconds per fake backend call")
+    p.add_argument("--fail-first", type=int, default=5, help="initial calls answered with 429")
+    p.set_defaults(func=bench_gateway)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import logging
+import math
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on automatically chosen cluster counts; one prompt line each
+MAX_AUTO_CLUSTERS = 12
+
+
+@dataclass
+class Cluster:
+    label: int
+    size: int
+    member_ids: List[str] = field(default_factory=list)
+    exemplars: List[str] = field(default_factory=list)
+    cohesion: float = 0.0
+
+
+def choose_k(n: int, max_k: int = MAX_AUTO_CLUSTERS) -> int:
+    """Rule-of-thumb cluster count, sqrt(n / 2), clamped to [1, max_k]."""
+    return max(1, min(max_k, n, round(math.sqrt(n / 2))))
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def spherical_kmeans(
+    vectors: np.ndarray,
+    k: int,
+    iterations: int = 30,
+    seed: int = 0,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    K-means under cosine similarity, fully vectorized.
+
+    Rows are L2-normalized, seeded with k-means++ and iterated with
+    assign (one matmul) / recompute (normalized mean) until labels stop
+    changing.
+
+    Args:
+        vectors: (n, d) embeddings
+        k: Number of clusters (clamped to n)
+        iterations: Maximum assign/update rounds
+        seed: Random seed, so reruns give the same clusters
+
+    Returns:
+        (labels of shape (n,), unit centroids of shape (k, d))
+    """
+    data = _normalize(np.asarray(vectors, dtype=np.float32))
+    n = len(data)
+    k = max(1, min(k, n))
+    rng = np.random.default_rng(seed)
+
+    # k-means++ seeding on cosine distance
+    centroids = np.empty((k, data.shape[1]), dtype=np.float32)
+    centroids[0] = data[rng.integers(n)]
+    closest = 1.0 - data @ centroids[0]
+    for c in range(1, k):
+        weights = np.clip(closest, 0.0, None) ** 2
+        total = weights.sum()
+        pick = rng.choice(n, p=weights / total) if total > 0 else rng.integers(n)
+        centroids[c] = data[pick]
+        closest = np.minimum(closest, 1.0 - data @ centroids[c])
+
+    labels = np.full(n, -1)
+    for _ in range(iterations):
+        new_labels = np.argmax(data @ centroids.T, axis=1)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, data)
+        empty = ~sums.any(axis=1)
+        if empty.any():
+            # Re-seed empty clusters with the points furthest from their centroid
+            fit = np.sum(data * centroids[labels], axis=1)
+            sums[empty] = data[np.argsort(fit)[:empty.sum()]]
+        centroids = _normalize(sums)
+
+    return labels, centroids
+
+
+def cluster_documents(
+    ids: List[str],
+    documents: List[str],
+    embeddings: np.ndarray,
+    k: int = None,
+    exemplars: int = 3,
+    seed: int = 0,
+) -> List[Cluster]:
+    """
+    Group documents into candidate themes with exact member counts.
+
+    Args:
+        ids: Document ids
+        documents: Document texts
+        embeddings: One embedding per document
+        k: Cluster count (default: choose_k)
+        exemplars: Documents per cluster closest to its centroid to keep
+        seed: Random seed for k-means
+
+    Returns:
+        Clusters, largest first
+    """
+    if not documents:
+        return []
+
+    data = _normalize(np.asarray(embeddings, dtype=np.float32))
+    labels, centroids = spherical_kmeans(data, k or choose_k(len(documents)), seed=seed)
+    similarity = np.sum(data * centroids[labels], axis=1)
+
+    clusters = []
+    for label in np.unique(labels):
+        members = np.flatnonzero(labels == label)
+        nearest = members[np.argsort(-similarity[members], kind="stable")]
+
+        picked, seen = [], set()
+        for i in nearest:
+            # Skip exact repeats so exemplars show different wording
+            text = " ".join(documents[i].split())
+            if text.lower() not in seen:
+                seen.add(text.lower())
+                picked.append(text)
+            if len(picked) == exemplars:
+                break
+
+        clusters.append(Cluster(
+            label=int(label),
+            size=len(members),
+            member_ids=[ids[i] for i in members],
+            exemplars=picked,
+            cohesion=round(float(similarity[members].mean()), 3),
+        ))
+
+    clusters.sort(key=lambda c: c.size, reverse=True)
+    logger.info(
+        f"Clustered {len(documents)} documents into {len(clusters)} groups: "
+        f"{[c.size for c in clusters]}"
+    )
+    return clusters
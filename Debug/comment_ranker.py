@@ -1,20 +1,62 @@
+import heapq
 import logging
-from typing import List, Dict, Any
+import math
+from typing import Callable, Iterable, List, Dict, Any, Mapping, Union
 
 logger = logging.getLogger(__name__)
 
+Scorer = Callable[[Dict[str, Any]], float]
+
+
+def score_only(comment: Dict[str, Any]) -> float:
+    """Reddit score as-is."""
+    return comment.get("score", 0)
+
+
+class DepthDecayScorer:
+    """Reddit score discounted by reply depth, favouring top-level comments."""
+
+    def __init__(self, decay: float = 0.8):
+        self.decay = decay
+
+    def __call__(self, comment: Dict[str, Any]) -> float:
+        score = comment.get("score", 0)
+        factor = self.decay ** comment.get("depth", 0)
+        # Discount toward zero for positive scores, away from it for negative ones
+        return score * factor if score >= 0 else score / factor
+
+
+class LengthWeightedScorer:
+    """Reddit score boosted by body length, favouring substantive comments."""
+
+    def __init__(self, weight: float = 0.25):
+        self.weight = weight
+
+    def __call__(self, comment: Dict[str, Any]) -> float:
+        length_boost = 1 + self.weight * math.log1p(len(comment.get("body", "")))
+        return comment.get("score", 0) * length_boost
+
+
+SCORERS: Dict[str, Scorer] = {
+    "score": score_only,
+    "depth_decay": DepthDecayScorer(),
+    "length_weighted": LengthWeightedScorer(),
+}
+
 
 class CommentRanker:
-    """Ranks comments by score only."""
+    """Ranks comments with a pluggable scoring strategy (Reddit score by default)."""
 
-    def __init__(self, top_n: int = 3):
+    def __init__(self, top_n: int = 3, scorer: Union[str, Scorer] = "score"):
         """
         Initialize ranker.
 
         Args:
             top_n: Number of top comments to return (default 3)
+            scorer: Name from SCORERS or a callable mapping a comment to a number
         """
         self.top_n = top_n
+        self.scorer = SCORERS[scorer] if isinstance(scorer, str) else scorer
 
     def is_valid_comment(self, comment: Dict[str, Any]) -> bool:
         """
@@ -36,29 +78,47 @@ class CommentRanker:
 
         return True
 
-    def rank_comments(self, comments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def rank_comments(self, comments: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
-        Rank comments by score and return top N.
+        Rank comments and return top N.
+
+        Runs in O(n log N) time with only N comments held at once, so long
+        threads can be streamed straight in.
 
         Args:
-            comments: List of comment dictionaries
+            comments: Comment dictionaries (a list or a streaming iterator)
 
         Returns:
-            Top N comments sorted by score (descending)
+            Top N comments sorted by scorer (descending)
         """
-        valid_comments = [c for c in comments if self.is_valid_comment(c)]
+        valid_comments = (c for c in comments if self.is_valid_comment(c))
+
+        # Bounded heap; ties keep input order like a stable sort
+        top_comments = heapq.nlargest(self.top_n, valid_comments, key=self.scorer)
 
-        if not valid_comments:
+        if not top_comments:
             logger.debug("No valid comments found")
             return []
 
-        # Sort by score (descending)
-        valid_comments.sort(key=lambda x: x.get("score", 0), reverse=True)
+        logger.debug(f"Selected top {len(top_comments)} comments")
+        return top_comments
 
-        top_comments = valid_comments[:self.top_n]
+    def rank_many(
+        self, comments_by_post: Mapping[str, Iterable[Dict[str, Any]]]
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Rank comments for many posts in one call.
 
-        logger.debug(f"Selected top {len(top_comments)} comments from {len(valid_comments)}")
-        return top_comments
+        Args:
+            comments_by_post: Comments (lists or iterators) keyed by post id
+
+        Returns:
+            Top N comments keyed by post id, in input order
+        """
+        return {
+            post_id: self.rank_comments(comments)
+            for post_id, comments in comments_by_post.items()
+        }
 
     def format_comment(self, comment: Dict[str, Any]) -> Dict[str, Any]:
         """
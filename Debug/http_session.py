@@ -0,0 +1,59 @@
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# 429 is left to the rate limiter, which shares backoff across callers
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+def build_session(
+    pool_size: int = 10,
+    max_retries: int = 3,
+    backoff_factor: float = 0.5,
+    backoff_jitter: float = 0.5,
+    gzip: bool = True,
+) -> requests.Session:
+    """
+    Build a keep-alive session with a connection pool and retries.
+
+    Connections to a host are reused across calls, so only the first
+    request per pooled connection pays the TCP + TLS handshake.
+
+    Args:
+        pool_size: Connections kept per host (match the ingestion worker count or more)
+        max_retries: Retries for connection errors and 5xx responses (default 3)
+        backoff_factor: Base of the exponential backoff between retries, in seconds
+        backoff_jitter: Random extra delay, up to this many seconds, added to each backoff
+        gzip: Ask for gzip-compressed responses (default True)
+
+    Returns:
+        Configured requests.Session
+    """
+    retry = Retry(
+        total=max_retries,
+        connect=max_retries,
+        read=max_retries,
+        status=max_retries,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "POST"}),
+        backoff_factor=backoff_factor,
+        backoff_jitter=backoff_jitter,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=retry,
+    )
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Accept-Encoding"] = "gzip, deflate" if gzip else "identity"
+
+    logger.debug(f"Built HTTP session: pool_size={pool_size}, max_retries={max_retries}")
+    return session
@@ -0,0 +1,164 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from plan_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue is at its depth limit."""
+
+
+@dataclass
+class Job:
+    id: str
+    query: str
+    status: str = "queued"
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "query": self.query,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    """
+    In-process job queue running pipeline calls on a bounded worker pool.
+
+    Identical queries (after normalization) submitted while one is queued
+    or running share that job. Submissions beyond `workers + max_queued`
+    active jobs are rejected with QueueFull. Finished jobs are kept for
+    `ttl` seconds.
+    """
+
+    def __init__(
+        self,
+        run: Callable[[str], Dict[str, Any]],
+        workers: int = 2,
+        max_queued: int = 16,
+        ttl: float = 3600.0,
+    ):
+        """
+        Initialize queue.
+
+        Args:
+            run: Job body, e.g. AnalysisPipeline.run
+            workers: Jobs running at once
+            max_queued: Jobs waiting for a worker before submissions get QueueFull
+            ttl: Seconds a finished job's result stays available
+        """
+        self.run = run
+        self.workers = workers
+        self.max_queued = max_queued
+        self.ttl = ttl
+
+        self.submitted = 0
+        self.deduplicated = 0
+        self.rejected = 0
+
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Job] = {}
+        self._active: Dict[str, str] = {}
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+
+    def submit(self, query: str) -> Tuple[Job, bool]:
+        """
+        Queue a job, or join an identical queued or running one.
+
+        Args:
+            query: Natural language user query
+
+        Returns:
+            (job, created) where created is False for a deduplicated submission
+
+        Raises:
+            QueueFull: When workers + max_queued jobs are already active
+        """
+        key = normalize_query(query)
+
+        with self._lock:
+            self._purge(time.time())
+
+            job_id = self._active.get(key)
+            if job_id is not None:
+                self.deduplicated += 1
+                return self._jobs[job_id], False
+
+            if len(self._active) >= self.workers + self.max_queued:
+                self.rejected += 1
+                raise QueueFull(f"{len(self._active)} jobs queued or running")
+
+            job = Job(id=uuid.uuid4().hex, query=query)
+            self._jobs[job.id] = job
+            self._active[key] = job.id
+            self.submitted += 1
+
+        self._pool.submit(self._execute, job, key)
+        return job, True
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Return a job by id, or None if unknown or expired."""
+        with self._lock:
+            self._purge(time.time())
+            return self._jobs.get(job_id)
+
+    def _execute(self, job: Job, key: str) -> None:
+        job.status = "running"
+        job.started_at = time.time()
+        logger.info(f"Job {job.id} started")
+
+        try:
+            job.result = self.run(job.query)
+            job.status = "done"
+        except Exception as e:
+            logger.exception(f"Job {job.id} failed")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._active.pop(key, None)
+            logger.info(f"Job {job.id} {job.status} in {job.finished_at - job.started_at:.2f}s")
+
+    def _purge(self, now: float) -> None:
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and now - job.finished_at >= self.ttl
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth and submission counters."""
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {
+            "queued": statuses.count("queued"),
+            "running": statuses.count("running"),
+            "retained": statuses.count("done") + statuses.count("failed"),
+            "submitted": self.submitted,
+            "deduplicated": self.deduplicated,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self, wait: bool = False) -> None:
+        """Stop accepting work; queued jobs are cancelled unless `wait`."""
+        self._pool.shutdown(wait=wait, cancel_futures=not wait)
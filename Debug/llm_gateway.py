@@ -0,0 +1,341 @@
+"""
+Shared gateway for every Gemini call (planning, analysis and embeddings).
+
+One process-wide semaphore bounds calls in flight; each call gets a
+deadline, exponential backoff with jitter on 429/5xx and latency/token
+accounting. Set LLM_BACKEND=fake to run offline.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import statistics
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+from prompt_packer import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+GEMINI_MODEL = "gemini-2.5-flash"
+EMBEDDING_MODEL = "models/embedding-001"
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Transient failures without a status; google-genai raises the httpx ones
+RETRY_ERRORS = (TimeoutError, ConnectionError, httpx.TimeoutException, httpx.TransportError)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a call, including its retries, runs past its deadline."""
+
+
+class BackendError(Exception):
+    """Error from a backend call, carrying the HTTP status when known."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class CallRecord:
+    kind: str
+    model: str
+    latency: float
+    attempts: int
+    input_tokens: int
+    output_tokens: int
+    ok: bool
+
+
+# ---------------- BACKENDS ---------------- #
+
+class GeminiBackend:
+    """google.genai client, created on first use."""
+
+    def __init__(self, api_key: str = None):
+        self.api_key = api_key or os.getenv("GEMINI_API_KEY")
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                from google import genai
+                self._client = genai.Client(api_key=self.api_key)
+            return self._client
+
+    def generate(self, model: str, prompt: str, timeout: float) -> Tuple[str, int, int]:
+        from google.genai import types
+
+        response = self.client.models.generate_content(
+            model=model,
+            contents=prompt,
+            config=types.GenerateContentConfig(
+                http_options=types.HttpOptions(timeout=max(1, int(timeout * 1000)))
+            ),
+        )
+        usage = response.usage_metadata
+        input_tokens = getattr(usage, "prompt_token_count", None) or estimate_tokens(prompt)
+        output_tokens = getattr(usage, "candidates_token_count", None) or estimate_tokens(response.text or "")
+        return response.text, input_tokens, output_tokens
+
+    def embed(self, model: str, texts: List[str], timeout: float) -> Tuple[List[List[float]], int]:
+        from google.genai import types
+
+        res = self.client.models.embed_content(
+            model=model,
+            contents=texts,
+            config=types.EmbedContentConfig(
+                http_options=types.HttpOptions(timeout=max(1, int(timeout * 1000)))
+            ),
+        )
+        return [e.values for e in res.embeddings], sum(estimate_tokens(t) for t in texts)
+
+
+class FakeBackend:
+    """
+    Offline backend with simulated latency and injectable failures.
+
+    generate() returns `respond(prompt)` (default: an empty analysis);
+    embed() returns deterministic pseudo-random unit vectors per text.
+    The first `fail_first` calls raise BackendError(`fail_status`).
+    """
+
+    def __init__(
+        self,
+        respond: Callable[[str], str] = None,
+        latency: float = 0.0,
+        fail_first: int = 0,
+        fail_status: int = 429,
+        dim: int = 64,
+    ):
+        self.respond = respond or (lambda prompt: '{"themes": [], "overall_summary": ""}')
+        self.latency = latency
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.dim = dim
+
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _call(self, timeout: float) -> None:
+        with self._lock:
+            self.calls += 1
+            failing = self.calls <= self.fail_first
+        if self.latency > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"fake call took longer than {timeout:.2f}s")
+        time.sleep(self.latency)
+        if failing:
+            raise BackendError(f"fake {self.fail_status}", status_code=self.fail_status)
+
+    def generate(self, model: str, prompt: str, timeout: float) -> Tuple[str, int, int]:
+        self._call(timeout)
+        text = self.respond(prompt)
+        return text, estimate_tokens(prompt), estimate_tokens(text)
+
+    def embed(self, model: str, texts: List[str], timeout: float) -> Tuple[List[List[float]], int]:
+        self._call(timeout)
+        vectors = []
+        for text in texts:
+            seed = int(hashlib.sha1(text.encode("utf-8")).hexdigest()[:8], 16)
+            vector = np.random.default_rng(seed).standard_normal(self.dim)
+            vectors.append((vector / np.linalg.norm(vector)).tolist())
+        return vectors, sum(estimate_tokens(t) for t in texts)
+
+
+BACKENDS = {
+    "gemini": GeminiBackend,
+    "fake": FakeBackend,
+}
+
+
+# ---------------- GATEWAY ---------------- #
+
+def status_of(error: Exception) -> Optional[int]:
+    """HTTP status of a backend error (google.genai APIError, requests, BackendError)."""
+    for attr in ("status_code", "code"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+class LLMGateway:
+    """
+    Rate-safe front door for text generation and embedding calls.
+
+    Sync calls block on a shared semaphore; async calls run the same
+    path in a worker thread, so both count against one limit.
+    """
+
+    def __init__(
+        self,
+        backend=None,
+        max_concurrency: int = 8,
+        max_retries: int = 4,
+        base_delay: float = 0.5,
+        max_delay: float = 20.0,
+        timeout: float = 60.0,
+        history: int = 1000,
+    ):
+        """
+        Initialize gateway.
+
+        Args:
+            backend: GeminiBackend (default) or FakeBackend
+            max_concurrency: Calls in flight across all threads and tasks
+            max_retries: Retries after a 429/5xx, timeout or connection error (default 4)
+            base_delay: First backoff in seconds, doubled per retry
+            max_delay: Upper bound for one backoff
+            timeout: Default per-call deadline in seconds, covering all retries
+            history: Recent CallRecords kept for stats()
+        """
+        self.backend = backend or GeminiBackend()
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._records: deque = deque(maxlen=history)
+        self._totals = {
+            "calls": 0, "errors": 0, "retries": 0, "input_tokens": 0, "output_tokens": 0,
+        }
+
+    def generate(self, prompt: str, model: str = GEMINI_MODEL, timeout: float = None) -> str:
+        """
+        Generate text for a prompt.
+
+        Args:
+            prompt: Prompt text
+            model: Gemini model name
+            timeout: Deadline in seconds for the call and its retries
+
+        Returns:
+            Response text
+        """
+        return self._call(
+            "generate", model, timeout,
+            lambda remaining: self.backend.generate(model, prompt, remaining),
+        )
+
+    def embed(self, texts: List[str], model: str = EMBEDDING_MODEL, timeout: float = None) -> List[List[float]]:
+        """
+        Embed texts in one backend call.
+
+        Args:
+            texts: Texts to embed (the caller batches to the API limit)
+            model: Embedding model name
+            timeout: Deadline in seconds for the call and its retries
+
+        Returns:
+            One vector per text
+        """
+        return self._call(
+            "embed", model, timeout,
+            lambda remaining: self.backend.embed(model, texts, remaining) + (0,),
+        )
+
+    async def agenerate(self, prompt: str, model: str = GEMINI_MODEL, timeout: float = None) -> str:
+        return await asyncio.to_thread(self.generate, prompt, model, timeout)
+
+    async def aembed(self, texts: List[str], model: str = EMBEDDING_MODEL, timeout: float = None) -> List[List[float]]:
+        return await asyncio.to_thread(self.embed, texts, model, timeout)
+
+    def _call(self, kind: str, model: str, timeout: Optional[float], attempt_fn: Callable[[float], tuple]) -> Any:
+        start = time.monotonic()
+        deadline = start + (timeout or self.timeout)
+        attempts = 0
+        input_tokens = output_tokens = 0
+        ok = False
+
+        try:
+            while True:
+                # A slot is held only while a request is in flight, not during backoff
+                if not self._semaphore.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                    raise DeadlineExceeded(f"{kind} call waited past its deadline for a free slot")
+                try:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise DeadlineExceeded(f"{kind} call exceeded its deadline after {attempts} attempts")
+                    attempts += 1
+                    value, input_tokens, output_tokens = attempt_fn(remaining)
+                    ok = True
+                    return value
+                except DeadlineExceeded:
+                    raise
+                except Exception as e:
+                    status = status_of(e)
+                    retryable = status in RETRY_STATUSES or isinstance(e, RETRY_ERRORS)
+                    if not retryable or attempts > self.max_retries:
+                        raise
+                    error = e
+                finally:
+                    self._semaphore.release()
+
+                # Full jitter keeps concurrent callers from retrying in lockstep
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempts - 1)))
+                if time.monotonic() + delay >= deadline:
+                    raise DeadlineExceeded(f"{kind} call out of time to retry: {error}") from error
+                logger.warning(f"{kind} call failed ({status or type(error).__name__}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+        finally:
+            self._record(CallRecord(
+                kind, model, time.monotonic() - start, attempts, input_tokens, output_tokens, ok
+            ))
+
+    def _record(self, record: CallRecord) -> None:
+        with self._lock:
+            self._records.append(record)
+            self._totals["calls"] += 1
+            self._totals["errors"] += not record.ok
+            self._totals["retries"] += max(0, record.attempts - 1)
+            self._totals["input_tokens"] += record.input_tokens
+            self._totals["output_tokens"] += record.output_tokens
+
+    def stats(self) -> Dict[str, Any]:
+        """Return call, retry and token totals plus latency over recent calls."""
+        with self._lock:
+            latencies = sorted(r.latency for r in self._records)
+            totals = dict(self._totals)
+
+        if latencies:
+            totals["latency_mean"] = round(statistics.mean(latencies), 3)
+            totals["latency_p95"] = round(latencies[int(0.95 * (len(latencies) - 1))], 3)
+        return totals
+
+
+_shared_gateway: Optional[LLMGateway] = None
+_shared_lock = threading.Lock()
+
+
+def get_gateway() -> LLMGateway:
+    """
+    Return the process-wide gateway, creating it on first use.
+
+    Configured from LLM_BACKEND ("gemini" or "fake"), LLM_MAX_CONCURRENCY
+    and LLM_TIMEOUT.
+    """
+    global _shared_gateway
+    with _shared_lock:
+        if _shared_gateway is None:
+            _shared_gateway = LLMGateway(
+                backend=BACKENDS[os.getenv("LLM_BACKEND", "gemini")](),
+                max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+                timeout=float(os.getenv("LLM_TIMEOUT", "60")),
+            )
+        return _shared_gateway
@@ -1,9 +1,11 @@
 import json
-from vector_store import VectorStore
+from vector_store import VectorStore, get_vector_store
 import logging
 import os
 import sys
-from typing import Dict, List, Any
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from typing import Dict, Iterator, List, Any, Optional
 
 from dotenv import load_dotenv
 
@@ -22,17 +24,40 @@ logger = logging.getLogger(__name__)
 class RedditIngestionService:
     """Main service orchestrating Reddit data ingestion."""
 
-    def __init__(self):
-        """Initialize service with Reddit client."""
-        self.vector_store = VectorStore()
+    def __init__(
+        self,
+        reddit_client: RedditClient = None,
+        vector_store: VectorStore = None,
+        max_workers: int = 4,
+        comment_scorer: str = "score",
+    ):
+        """
+        Initialize service with Reddit client.
 
-    def process_post(self, post: Dict[str, Any], comment_limit: int = 3) -> Dict[str, Any]:
+        Args:
+            reddit_client: Optional pre-built Reddit client
+            vector_store: Optional pre-built vector store (default: the shared store)
+            max_workers: Maximum concurrent Reddit requests per ingestion (default 4)
+            comment_scorer: CommentRanker scoring strategy ("score", "depth_decay", "length_weighted")
+        """
+        self.reddit_client = reddit_client or RedditClient()
+        self.vector_store = vector_store or get_vector_store()
+        self.max_workers = max_workers
+        self.comment_scorer = comment_scorer
+
+    def process_post(
+        self,
+        post: Dict[str, Any],
+        comment_limit: int = 3,
+        comments: Optional[List[Dict[str, Any]]] = None,
+    ) -> Dict[str, Any]:
         """
         Process a single post: extract data and fetch top comments.
 
         Args:
             post: Post dictionary from Reddit API
             comment_limit: Number of top comments to return (default 3)
+            comments: Already fetched (or pre-ranked) comments; fetched here when omitted
 
         Returns:
             Dictionary with post data and top comments
@@ -41,36 +66,43 @@ class RedditIngestionService:
         subreddit = post.get("subreddit", "")
 
         # Fetch comments
-        comments = self.reddit_client.fetch_comments(post_id, subreddit)
+        if comments is None:
+            comments = self.reddit_client.fetch_comments(post_id, subreddit)
         
         # Rank comments by score
-        ranker = CommentRanker(top_n=comment_limit)
+        ranker = CommentRanker(top_n=comment_limit, scorer=self.comment_scorer)
         top_comments = ranker.rank_comments(comments)
 
         # Format comments
         formatted_comments = [ranker.format_comment(c) for c in top_comments]
 
-        # Store post title
-self.vector_store.add(
-    text=post.get("title", ""),
-    metadata={
-        "type": "post",
-        "subreddit": subreddit
-    }
-)
-
-# Store top comments
-for comment in formatted_comments:
-    self.vector_store.add(
-        text=comment["body"],
-        metadata={
-            "type": "comment",
-            "subreddit": subreddit,
-            "score": comment["score"]
-        }
-    )
+        # Store post title and top comments (buffered, embedded in batches).
+        # Ids come from Reddit so re-ingesting a post upserts instead of duplicating
+        texts = [post.get("title", "")]
+        ids = [f"post:{post_id}" if post_id else None]
+        # Metadata fields are what retrieval can filter on (see vector_store.build_where)
+        created_utc = int(post.get("created_utc", 0))
+        metadatas = [{
+            "type": "post",
+            "subreddit": subreddit.lower(),
+            "post_id": post_id,
+            "score": post.get("score", 0),
+            "created_utc": created_utc
+        }]
+        for raw, comment in zip(top_comments, formatted_comments):
+            texts.append(comment["body"])
+            ids.append(f"comment:{raw['id']}" if raw.get("id") else None)
+            metadatas.append({
+                "type": "comment",
+                "subreddit": subreddit.lower(),
+                "post_id": post_id,
+                "score": comment["score"],
+                "created_utc": created_utc
+            })
+        self.vector_store.add_many(texts, metadatas, ids=ids)
 
         return {
+            "id": post_id,
             "title": post.get("title", ""),
             "url": f"https://reddit.com{post.get('permalink', '')}",
             "score": post.get("score", 0),
@@ -151,77 +183,315 @@ for comment in formatted_comments:
 
         results = []
 
+        keywords, searches = self._plan_searches(input_data)
+        posts_by_search, comments_by_post = self._fetch_all(
+            searches, posts_limit, comment_limit=comment_limit
+        )
+
+        # Post registry: each post is ranked and stored once, under the first
+        # search (in plan order) that found it; later matches only add keywords
+        registry: Dict[str, Dict[str, Any]] = {}
+        post_matches = 0
+
+        # Rank and store in plan order so output is deterministic
+        for i, (keyword, subreddit_name) in enumerate(searches):
+            processed_posts = []
+            for post in posts_by_search[i]:
+                post_id = post.get("id", "")
+                post_matches += 1
+
+                if post_id in registry:
+                    matched = registry[post_id]["matched_keywords"]
+                    if keyword not in matched:
+                        matched.append(keyword)
+                    continue
+
+                if post_id not in comments_by_post:
+                    # Comment fetch failed; already logged by _fetch_all
+                    continue
+
+                try:
+                    processed_post = self.process_post(
+                        post,
+                        comment_limit=comment_limit,
+                        comments=comments_by_post[post_id]
+                    )
+                    processed_post["matched_keywords"] = [keyword]
+                    registry[post_id] = processed_post
+                    processed_posts.append(processed_post)
+                except Exception as e:
+                    logger.error(
+                        f"Error processing post {post.get('id', 'unknown')}: {e}"
+                    )
+
+            if processed_posts:
+                results.append({
+                    "keyword": keyword,
+                    "subreddit": subreddit_name,
+                    "posts": processed_posts
+                })
+
+        self.vector_store.flush()
+
+        embedding_cache = getattr(self.vector_store, "embedding_cache", None)
+        if embedding_cache is not None:
+            logger.info(f"Embedding cache: {embedding_cache.stats()}")
+
+        unique_posts = len({post.get("id", "") for posts in posts_by_search for post in posts})
+        stats = {
+            "post_matches": post_matches,
+            "unique_posts": unique_posts,
+            "comment_fetches_saved": post_matches - unique_posts,
+            "comment_fetches_failed": unique_posts - len(comments_by_post),
+        }
+        logger.info(f"Post registry: {stats}")
+
+        output = {
+            "query": keywords,
+            "results": results,
+            "stats": stats,
+        }
+
+        return output
+
+    def iter_request(self, input_data: Dict[str, Any], max_pending: int = None) -> Iterator[Dict[str, Any]]:
+        """
+        Streaming form of process_request: yield each processed post as soon
+        as its comments are ranked and it is queued for embedding.
+
+        Posts arrive in completion order, not plan order. At most
+        `max_pending` comment fetches run ahead of the consumer, so a slow
+        consumer throttles fetching instead of piling up results. Closing
+        the generator cancels searches and fetches not yet started.
+
+        Args:
+            input_data: Input JSON dictionary
+            max_pending: Comment fetches in flight (default: 2 x max_workers)
+
+        Yields:
+            Processed post dictionaries, as returned by process_post, plus
+            "subreddit" and "matched_keywords" (extended as later searches
+            match the same post)
+        """
+        _, searches = self._plan_searches(input_data)
+        posts_limit = min(input_data.get("posts_limit_per_subreddit", 5) or 5, 5)
+        comment_limit = input_data.get("comments_limit_per_post", 3)
+
+        registry: Dict[str, Dict[str, Any]] = {}
+        early_matches: Dict[str, List[str]] = {}
+
+        fetched = self._iter_fetched(searches, posts_limit, comment_limit, max_pending)
+        try:
+            for i, post, comments in fetched:
+                keyword, subreddit_name = searches[i]
+                post_id = post.get("id", "")
+
+                if comments is None:
+                    # Another search found this post; it may still be in flight
+                    processed_post = registry.get(post_id)
+                    matched = processed_post["matched_keywords"] if processed_post else early_matches.setdefault(post_id, [])
+                    if keyword not in matched:
+                        matched.append(keyword)
+                    continue
+
+                try:
+                    processed_post = self.process_post(post, comment_limit=comment_limit, comments=comments)
+                except Exception as e:
+                    logger.error(f"Error processing post {post_id or 'unknown'}: {e}")
+                    continue
+
+                processed_post["subreddit"] = subreddit_name
+                processed_post["matched_keywords"] = list(dict.fromkeys([keyword] + early_matches.pop(post_id, [])))
+                registry[post_id] = processed_post
+                yield processed_post
+        finally:
+            # Cancels outstanding fetches when the consumer stops early
+            fetched.close()
+
+        self.vector_store.flush()
+        logger.info(f"Streamed {len(registry)} unique posts from {len(searches)} searches")
+
+    def _plan_searches(self, input_data: Dict[str, Any]) -> tuple:
+        """Return (keywords, (keyword, subreddit) pairs in plan order) for a request."""
         keywords = input_data.get("keywords", [])
         if not keywords:
             keywords = [input_data.get("query", "")]
 
-        for keyword in keywords:
-            if not keyword:
-                continue
+        searches = [
+            (keyword, subreddit_name)
+            for keyword in keywords
+            if keyword
+            for subreddit_name in input_data.get("target_subreddits", [])
+        ]
+        return keywords, searches
+
+    def _search_posts(self, keyword: str, subreddit_name: str, limit: int) -> List[Dict[str, Any]]:
+        """Search one subreddit for one keyword, returning [] on failure."""
+        try:
+            return self.reddit_client.search_subreddit(
+                subreddit_name,
+                query=keyword,
+                limit=limit,
+                sort="relevance"
+            )
+        except Exception as e:
+            logger.error(
+                f"Error processing keyword '{keyword}' in subreddit {subreddit_name}: {e}"
+            )
+            return []
+
+    def _fetch_top_comments(self, post_id: str, subreddit: str, comment_limit: int) -> List[Dict[str, Any]]:
+        """Stream a post's comments straight into the ranker, keeping only the top N."""
+        ranker = CommentRanker(top_n=comment_limit, scorer=self.comment_scorer)
+        return ranker.rank_comments(self.reddit_client.iter_comments(post_id, subreddit))
+
+    def _fetch_all(self, searches: List[tuple], posts_limit: int, comment_limit: int = 3) -> tuple:
+        """
+        Run all searches and comment fetches on a bounded thread pool.
 
-            logger.info(f"Processing keyword: '{keyword}'")
+        Comment fetches for a search's posts are queued as soon as that
+        search returns, so searches and comment fetches overlap. A post
+        returned by several searches is fetched only once.
 
-            for subreddit_name in target_subreddits:
-                try:
-                    posts = self.reddit_client.search_subreddit(
-                        subreddit_name,
-                        query=keyword,
-                        limit=posts_limit,
-                        sort="relevance"
-                    )
+        Args:
+            searches: (keyword, subreddit) pairs in plan order
+            posts_limit: Maximum posts per search
+            comment_limit: Top comments kept per post (default 3)
 
-                    if not posts:
+        Returns:
+            (posts per search index, top comments keyed by post id)
+        """
+        posts_by_search = [[] for _ in searches]
+        comment_futures = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            search_futures = {
+                pool.submit(self._search_posts, keyword, subreddit_name, posts_limit): i
+                for i, (keyword, subreddit_name) in enumerate(searches)
+            }
+
+            for future in as_completed(search_futures):
+                i = search_futures[future]
+                posts_by_search[i] = future.result()
+
+                for post in posts_by_search[i]:
+                    post_id = post.get("id", "")
+                    if post_id in comment_futures:
                         continue
+                    comment_futures[post_id] = pool.submit(
+                        self._fetch_top_comments,
+                        post_id,
+                        post.get("subreddit", ""),
+                        comment_limit
+                    )
 
-                    processed_posts = []
-                    for post in posts:
-                        try:
-                            processed_post = self.process_post(
-                                post,
-                                comment_limit=comment_limit
-                            )
-                            processed_posts.append(processed_post)
-                        except Exception as e:
-                            logger.error(
-                                f"Error processing post {post.get('id', 'unknown')}: {e}"
-                            )
-
-                    if processed_posts:
-                        results.append({
-                            "keyword": keyword,
-                            "subreddit": subreddit_name,
-                            "posts": processed_posts
-                        })
-
+            comments_by_post = {}
+            for key, future in comment_futures.items():
+                try:
+                    comments_by_post[key] = future.result()
                 except Exception as e:
-                    logger.error(
-                        f"Error processing keyword '{keyword}' in subreddit {subreddit_name}: {e}"
+                    # One bad thread must not fail the whole request
+                    logger.error(f"Error fetching comments for post {key or 'unknown'}: {e}")
+
+        logger.info(
+            f"Fetched {len(searches)} searches and {len(comments_by_post)} comment threads "
+            f"with {self.max_workers} workers"
+        )
+
+        cache = getattr(self.reddit_client, "cache", None)
+        if cache is not None:
+            logger.info(f"Reddit response cache: {cache.stats()}")
+        return posts_by_search, comments_by_post
+
+    def _iter_fetched(
+        self,
+        searches: List[tuple],
+        posts_limit: int,
+        comment_limit: int = 3,
+        max_pending: int = None,
+    ) -> Iterator[tuple]:
+        """
+        Run searches and comment fetches on a bounded pool, yielding as they finish.
+
+        Args:
+            searches: (keyword, subreddit) pairs
+            posts_limit: Maximum posts per search
+            comment_limit: Top comments kept per post (default 3)
+            max_pending: Comment fetches submitted ahead of the consumer
+
+        Yields:
+            (search index, post, top comments) for the first match of each
+            post, and (search index, post, None) for repeat matches
+        """
+        max_pending = max_pending or 2 * self.max_workers
+        unsearched = deque(enumerate(searches))
+        searching = {}
+        queued = deque()
+        fetching = {}
+        seen = set()
+
+        pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            while unsearched or searching or queued or fetching:
+                # Searches are submitted a pool's worth at a time so comment
+                # fetches interleave and an early close skips the rest
+                while unsearched and len(searching) < self.max_workers:
+                    i, (keyword, subreddit_name) = unsearched.popleft()
+                    searching[pool.submit(self._search_posts, keyword, subreddit_name, posts_limit)] = i
+
+                while queued and len(fetching) < max_pending:
+                    i, post = queued.popleft()
+                    future = pool.submit(
+                        self._fetch_top_comments, post.get("id", ""), post.get("subreddit", ""), comment_limit
                     )
-        output = {
-            "query": keywords,
-            "results": results,
-        }
+                    fetching[future] = (i, post)
+
+                done, _ = wait([*searching, *fetching], return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in searching:
+                        i = searching.pop(future)
+                        for post in future.result():
+                            post_id = post.get("id", "")
+                            if post_id in seen:
+                                yield i, post, None
+                            else:
+                                seen.add(post_id)
+                                queued.append((i, post))
+                        continue
 
-        return output            
+                    i, post = fetching.pop(future)
+                    try:
+                        comments = future.result()
+                    except Exception as e:
+                        logger.error(f"Error fetching comments for post {post.get('id', 'unknown')}: {e}")
+                        continue
+                    yield i, post, comments
+        finally:
+            # Without waiting: an early close must not run the remaining searches
+            for future in [*searching, *fetching]:
+                future.cancel()
+            pool.shutdown(wait=False, cancel_futures=True)
 
 
 
 def main():
-    if len(sys.argv) > 1:
+    if len(sys.argv) > 1 and sys.argv[1] != "-":
         input_file = sys.argv[1]
         with open(input_file, "r", encoding="utf-8") as f:
             input_data = json.load(f)
     else:
         input_data = json.load(sys.stdin)
 
+    output_file = sys.argv[2] if len(sys.argv) > 2 else "ingestion_output.json"
+
     service = RedditIngestionService()
     output = service.process_request(input_data)
 
     # print(json.dumps(output, indent=2, ensure_ascii=False))
-    with open("ingestion_output.json", "w", encoding="utf-8") as f:
+    with open(output_file, "w", encoding="utf-8") as f:
         json.dump(output, f, indent=2, ensure_ascii=False)
 
-    print("Saved ingestion_output.json")
+    print(f"Saved {output_file}")
 
 
 
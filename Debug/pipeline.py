@@ -0,0 +1,228 @@
+import logging
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, Iterator, Optional
+
+from main import RedditIngestionService
+from prompt_packer import ChunkBuilder
+from query_planner_agent import generate_research_plan
+from reddit_analysis_agent import (
+    MAP_REDUCE_CONCURRENCY,
+    PROMPT_ITEM_TOKENS,
+    PROMPT_TOKEN_BUDGET,
+    ask_llm,
+    build_prompt,
+    reduce_themes,
+    run_analysis,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisPipeline:
+    """Runs planning, ingestion and analysis in-process, passing plain dicts."""
+
+    def __init__(
+        self,
+        ingestion_service: Optional[RedditIngestionService] = None,
+        analysis_mode: str = None,
+        llm: Callable[[str], str] = None,
+    ):
+        """
+        Initialize pipeline. Build once and reuse across requests.
+
+        Args:
+            ingestion_service: Optional pre-built ingestion service
+            analysis_mode: "single" or "map_reduce" (default: $ANALYSIS_MODE)
+            llm: Optional replacement for the analysis Gemini call
+        """
+        self.ingestion_service = ingestion_service or RedditIngestionService()
+        self.analysis_mode = analysis_mode
+        self.llm = llm
+
+    def plan(self, query: str) -> Dict[str, Any]:
+        """
+        Convert a user query into a research plan.
+
+        Args:
+            query: Natural language user query
+
+        Returns:
+            Research plan dictionary
+        """
+        return generate_research_plan(query)
+
+    def ingest(self, plan: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Fetch, rank and store Reddit discussions for a research plan.
+
+        Args:
+            plan: Research plan dictionary
+
+        Returns:
+            Ingestion output dictionary
+        """
+        output = self.ingestion_service.process_request(plan)
+        output["business_description"] = plan.get("business_description", "")
+        return output
+
+    def analyze(self, ingestion_output: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run the analysis agent against the ingestion output.
+
+        Args:
+            ingestion_output: Ingestion output dictionary
+
+        Returns:
+            Analysis result dictionary
+        """
+        return run_analysis(
+            ingestion_output,
+            store=self.ingestion_service.vector_store,
+            mode=self.analysis_mode,
+            llm=self.llm,
+        )
+
+    def run(self, query: str) -> Dict[str, Any]:
+        """
+        Run the full pipeline for a user query.
+
+        All intermediate state lives in local dicts, so concurrent calls
+        never share files or results.
+
+        Args:
+            query: Natural language user query
+
+        Returns:
+            Analysis result dictionary
+        """
+        request_id = uuid.uuid4().hex[:8]
+
+        plan = self.plan(query)
+        logger.info(f"[{request_id}] Research plan ready: {len(plan.get('keywords', []))} keywords")
+
+        ingestion_output = self.ingest(plan)
+        logger.info(f"[{request_id}] Ingestion done: {len(ingestion_output['results'])} result groups")
+
+        return self.analyze(ingestion_output)
+
+    def stream(
+        self,
+        query: str,
+        max_concurrency: int = MAP_REDUCE_CONCURRENCY,
+        max_pending_chunks: int = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Run the pipeline with ingestion, embedding and analysis overlapped.
+
+        Posts flow out of ingestion as soon as their comments are ranked;
+        their texts are queued for batched embedding and packed into
+        prompt-sized chunks, and each full chunk goes to a map call while
+        fetching continues. A reduce call merges the chunk themes at the
+        end (see reddit_analysis_agent.reduce_themes). Chunks are analyzed
+        in arrival order rather than retrieval order.
+
+        When `max_pending_chunks` map calls are queued or running,
+        ingestion waits for the oldest to finish, so memory stays bounded
+        by the slowest stage.
+
+        Closing the generator early cancels searches, comment fetches and
+        map calls that have not started; calls already running finish in
+        the background but their results are discarded.
+
+        Args:
+            query: Natural language user query
+            max_concurrency: Map calls in flight
+            max_pending_chunks: Map calls queued or running (default: 2 x max_concurrency)
+
+        Yields:
+            Progress events: {"event": "plan"}, {"event": "post"} per
+            post (with posts so far per subreddit under "progress"),
+            {"event": "chunk"} per finished map call, and finally
+            {"event": "result", "result": <analysis result>}
+        """
+        request_id = uuid.uuid4().hex[:8]
+        max_pending_chunks = max_pending_chunks or 2 * max_concurrency
+
+        plan = self.plan(query)
+        business_context = plan.get("business_description", "")
+        logger.info(f"[{request_id}] Research plan ready: {len(plan.get('keywords', []))} keywords")
+        yield {"event": "plan", "plan": plan}
+
+        chunker = ChunkBuilder(PROMPT_TOKEN_BUDGET, max_item_tokens=PROMPT_ITEM_TOKENS)
+        pending = deque()
+        mapped = []
+
+        def chunk_event(result: Dict[str, Any]) -> Dict[str, Any]:
+            mapped.append(result)
+            return {
+                "event": "chunk",
+                "index": len(mapped) - 1,
+                "themes": result.get("themes", []),
+                "error": result.get("error"),
+            }
+
+        llm_pool = ThreadPoolExecutor(max_workers=max_concurrency)
+        posts = self.ingestion_service.iter_request(plan)
+        try:
+
+            def submit(chunk):
+                pending.append(llm_pool.submit(ask_llm, build_prompt(chunk, business_context), self.llm))
+
+            posts_by_subreddit: Dict[str, int] = {}
+            for post in posts:
+                subreddit = post["subreddit"]
+                posts_by_subreddit[subreddit] = posts_by_subreddit.get(subreddit, 0) + 1
+                yield {
+                    "event": "post",
+                    "id": post["id"],
+                    "title": post["title"],
+                    "subreddit": subreddit,
+                    "progress": dict(posts_by_subreddit),
+                }
+
+                for text in [post["title"]] + [c["body"] for c in post["top_comments"]]:
+                    chunk = chunker.add(text)
+                    if chunk:
+                        submit(chunk)
+
+                # Backpressure: wait for the oldest map call when too many are queued
+                while pending and (pending[0].done() or len(pending) >= max_pending_chunks):
+                    yield chunk_event(pending.popleft().result())
+
+            last = chunker.finish()
+            if last:
+                submit(last)
+            logger.info(f"[{request_id}] Ingestion done: {sum(posts_by_subreddit.values())} posts streamed")
+
+            while pending:
+                yield chunk_event(pending.popleft().result())
+        finally:
+            # Reached early when the consumer closes the stream: stop fetching
+            # and drop map calls that have not started
+            posts.close()
+            for future in pending:
+                future.cancel()
+            llm_pool.shutdown(wait=False, cancel_futures=True)
+
+        if not mapped:
+            result = {"themes": [], "overall_summary": "No meaningful discussion data found."}
+        else:
+            result = reduce_themes(mapped, business_context, llm=self.llm)
+        yield {"event": "result", "result": result}
+
+    def run_streaming(self, query: str, **kwargs) -> Dict[str, Any]:
+        """
+        Run the streaming pipeline and return only the final analysis result.
+
+        Args:
+            query: Natural language user query
+            **kwargs: Passed to stream()
+
+        Returns:
+            Analysis result dictionary
+        """
+        for event in self.stream(query, **kwargs):
+            if event["event"] == "result":
+                return event["result"]
@@ -0,0 +1,153 @@
+import copy
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    """Case-fold, Unicode-normalize and collapse whitespace and trailing punctuation."""
+    text = unicodedata.normalize("NFKC", query).casefold()
+    text = " ".join(text.split())
+    return re.sub(r"[\s.!?]+$", "", text)
+
+
+@dataclass
+class _Entry:
+    plan: Dict[str, Any]
+    vector: Optional[np.ndarray]
+    stored_at: float
+
+
+class PlanCache:
+    """
+    In-memory two-tier cache of research plans.
+
+    Tier one matches the normalized query exactly. Tier two embeds the
+    query and reuses the plan of the most similar cached query if its
+    cosine similarity reaches `similarity_threshold`. Entries expire
+    after `ttl` seconds and the least recently used are evicted beyond
+    `max_entries`.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 3600.0,
+        max_entries: int = 512,
+        similarity_threshold: float = 0.95,
+        embed: Callable[[str], List[float]] = None,
+    ):
+        """
+        Initialize cache.
+
+        Args:
+            ttl: Seconds a plan is reused (default 1 hour)
+            max_entries: Upper bound on cached plans before LRU eviction
+            similarity_threshold: Minimum cosine similarity for a semantic hit
+            embed: Text embedding function; None disables the semantic tier
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.embed = embed
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+
+    def _embed(self, text: str) -> Optional[np.ndarray]:
+        if self.embed is None:
+            return None
+        try:
+            vector = np.asarray(self.embed(text), dtype=np.float32)
+        except Exception as e:
+            # The exact tier still works without embeddings
+            logger.warning(f"Plan cache embedding failed, semantic lookup skipped: {e}")
+            return None
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else None
+
+    def _expire(self, now: float) -> None:
+        expired = [k for k, e in self._entries.items() if now - e.stored_at >= self.ttl]
+        for key in expired:
+            del self._entries[key]
+
+    def _nearest(self, vector: np.ndarray) -> Optional[str]:
+        keyed = [(k, e.vector) for k, e in self._entries.items() if e.vector is not None]
+        if not keyed:
+            return None
+        similarities = np.stack([v for _, v in keyed]) @ vector
+        best = int(np.argmax(similarities))
+        if similarities[best] >= self.similarity_threshold:
+            return keyed[best][0]
+        return None
+
+    def get_or_create(self, query: str, create: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Return a cached plan for `query`, or build one with `create` and cache it.
+
+        Args:
+            query: User query
+            create: Plan builder called on a miss, e.g. a Gemini call
+
+        Returns:
+            Research plan (a copy; callers may modify it)
+        """
+        key = normalize_query(query)
+
+        with self._lock:
+            self._expire(time.time())
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return copy.deepcopy(entry.plan)
+
+        vector = self._embed(key)
+        if vector is not None:
+            with self._lock:
+                match = self._nearest(vector)
+                if match is not None:
+                    self._entries.move_to_end(match)
+                    self.semantic_hits += 1
+                    logger.info(f"Plan cache: reusing plan for {match!r} for {key!r}")
+                    return copy.deepcopy(self._entries[match].plan)
+
+        with self._lock:
+            self.misses += 1
+
+        plan = create(query)
+
+        with self._lock:
+            self._entries[key] = _Entry(copy.deepcopy(plan), vector, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+        return plan
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the current hit rate."""
+        hits = self.exact_hits + self.semantic_hits
+        lookups = hits + self.misses
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+        }
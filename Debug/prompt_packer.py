@@ -0,0 +1,199 @@
+import logging
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Gemini's tokenizer averages about four characters per token on English text
+CHARS_PER_TOKEN = 4
+
+ELLIPSIS = "…"
+
+_SENTENCE_END = re.compile(r"[.!?](?=\s)")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap offline token estimate; pass a real counter to pack() for exact counts."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+@dataclass
+class PackResult:
+    items: List[str] = field(default_factory=list)
+    tokens_used: int = 0
+    budget: int = 0
+    dropped: int = 0
+    truncated: int = 0
+
+    def summary(self) -> str:
+        return (
+            f"{self.tokens_used}/{self.budget} tokens, {len(self.items)} items "
+            f"({self.truncated} truncated, {self.dropped} dropped)"
+        )
+
+
+def truncate_to_tokens(text: str, max_tokens: int, counter: Callable[[str], int] = estimate_tokens) -> str:
+    """
+    Shorten `text` to at most `max_tokens`, ending on a sentence or word boundary.
+
+    Args:
+        text: Text to shorten
+        max_tokens: Token limit including the trailing ellipsis
+        counter: Token counting function
+
+    Returns:
+        The text unchanged if it fits, otherwise a shortened copy ending in "…",
+        or "" if not even one word fits
+    """
+    if counter(text) <= max_tokens:
+        return text
+
+    # Start from the character estimate and shrink until the counter agrees
+    limit = min(len(text), max_tokens * CHARS_PER_TOKEN)
+    while limit > 0:
+        head = text[:limit]
+        sentences = [m.end() for m in _SENTENCE_END.finditer(head)]
+        if sentences and sentences[-1] >= limit // 2:
+            cut = head[:sentences[-1]]
+        else:
+            # Hard cut inside a single overlong "word" such as a URL
+            cut = head.rsplit(None, 1)[0] if " " in head.strip() else head[:-1]
+        cut = cut.rstrip()
+        if not cut:
+            return ""
+
+        candidate = cut + ELLIPSIS
+        if counter(candidate) <= max_tokens:
+            return candidate
+        limit = len(cut) - 1
+
+    return ""
+
+
+def pack(
+    texts: List[str],
+    budget: int,
+    prefix: str = "- ",
+    separator: str = "\n",
+    max_item_tokens: int = None,
+    min_item_tokens: int = 16,
+    counter: Callable[[str], int] = estimate_tokens,
+) -> PackResult:
+    """
+    Fit as many ranked texts as possible into a token budget.
+
+    Texts are taken in rank order. One that does not fit is truncated
+    to the remaining budget if at least `min_item_tokens` remain,
+    otherwise skipped, and packing continues with the next, shorter
+    texts. Prefix and separator tokens count against the budget.
+
+    Args:
+        texts: Texts, most relevant first
+        budget: Token budget for the packed block
+        prefix: Written before each item
+        separator: Written between items
+        max_item_tokens: Truncate any single item to this many tokens
+        min_item_tokens: Smallest truncated item worth including
+        counter: Token counting function (default: estimate_tokens)
+
+    Returns:
+        PackResult with the packed lines and token accounting
+    """
+    result = PackResult(budget=budget)
+    overhead = counter(prefix) + counter(separator)
+
+    for text in texts:
+        text = " ".join(text.split())
+        if not text:
+            continue
+
+        room = budget - result.tokens_used - overhead
+        if max_item_tokens is not None:
+            room = min(room, max_item_tokens)
+
+        cost = counter(text)
+        if cost > room:
+            if room < min_item_tokens:
+                result.dropped += 1
+                continue
+            text = truncate_to_tokens(text, room, counter)
+            if not text:
+                result.dropped += 1
+                continue
+            cost = counter(text)
+            result.truncated += 1
+
+        result.items.append(f"{prefix}{text}")
+        result.tokens_used += cost + overhead
+
+    logger.debug(f"Packed prompt: {result.summary()}")
+    return result
+
+
+def pack_chunks(
+    texts: List[str],
+    budget: int,
+    prefix: str = "- ",
+    separator: str = "\n",
+    max_item_tokens: int = None,
+    counter: Callable[[str], int] = estimate_tokens,
+) -> List[List[str]]:
+    """
+    Split ranked texts into consecutive chunks that each fit `budget` tokens.
+
+    Every text lands in some chunk (truncated to `max_item_tokens` and to
+    the budget if needed), so map-reduce analysis covers all of them.
+
+    Returns:
+        Lists of texts, without prefixes, each packable by pack() unchanged
+    """
+    chunker = ChunkBuilder(budget, prefix, separator, max_item_tokens, counter)
+    chunks = [chunk for chunk in map(chunker.add, texts) if chunk]
+    last = chunker.finish()
+    return chunks + [last] if last else chunks
+
+
+class ChunkBuilder:
+    """
+    Incremental pack_chunks: feed texts one at a time as they arrive and
+    get back each chunk as soon as it is full.
+    """
+
+    def __init__(
+        self,
+        budget: int,
+        prefix: str = "- ",
+        separator: str = "\n",
+        max_item_tokens: int = None,
+        counter: Callable[[str], int] = estimate_tokens,
+    ):
+        self.budget = budget
+        self.counter = counter
+        self.overhead = counter(prefix) + counter(separator)
+        self.item_limit = budget - self.overhead
+        if max_item_tokens is not None:
+            self.item_limit = min(self.item_limit, max_item_tokens)
+
+        self._current: List[str] = []
+        self._used = 0
+
+    def add(self, text: str) -> Optional[List[str]]:
+        """Add a text; returns the previous chunk if this text did not fit in it."""
+        text = truncate_to_tokens(" ".join(text.split()), self.item_limit, self.counter)
+        if not text:
+            return None
+
+        full = None
+        cost = self.counter(text) + self.overhead
+        if self._current and self._used + cost > self.budget:
+            full, self._current, self._used = self._current, [], 0
+        self._current.append(text)
+        self._used += cost
+        return full
+
+    def finish(self) -> Optional[List[str]]:
+        """Return the last, partly filled chunk, if any."""
+        last, self._current, self._used = self._current, [], 0
+        return last or None
@@ -1,19 +1,28 @@
 import json
+import logging
 import os
 import sys
-from typing import Dict, Any
+import threading
+from typing import Dict, Any, Optional
 
-from google import genai
+from llm_gateway import get_gateway
+from plan_cache import PlanCache
 
+logger = logging.getLogger(__name__)
 
-# ---------------- CONFIG ---------------- #
 
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+# ---------------- CONFIG ---------------- #
 
 GEMINI_MODEL = "gemini-2.5-flash"
 
+# Default CLI output; the API keeps plans in memory per request
 OUTPUT_FILE = "ex.json"
 
+# Plans are reused for PLAN_CACHE_TTL seconds, for the same query or one whose
+# embedding is at least PLAN_CACHE_SIMILARITY cosine-similar
+PLAN_CACHE_TTL = float(os.getenv("PLAN_CACHE_TTL", "3600"))
+PLAN_CACHE_SIMILARITY = float(os.getenv("PLAN_CACHE_SIMILARITY", "0.95"))
+
 
 # ---------------- PROMPT BUILDER ---------------- #
 
@@ -51,15 +60,56 @@ OUTPUT FORMAT:
 
 # ---------------- CORE LOGIC ---------------- #
 
-def generate_research_plan(user_query: str) -> Dict[str, Any]:
-    prompt = build_prompt(user_query)
+_plan_cache: Optional[PlanCache] = None
+_plan_cache_lock = threading.Lock()
+
+
+def _embed_query(text: str):
+    # Imported lazily: only the semantic cache tier needs the vector store,
+    # and the one-shot CLI skips the cache altogether
+    from vector_store import get_vector_store
+    return get_vector_store().embed(text)
+
+
+def get_plan_cache() -> PlanCache:
+    """Return the process-wide plan cache, creating it on first use."""
+    global _plan_cache
+    with _plan_cache_lock:
+        if _plan_cache is None:
+            _plan_cache = PlanCache(
+                ttl=PLAN_CACHE_TTL,
+                similarity_threshold=PLAN_CACHE_SIMILARITY,
+                embed=_embed_query
+            )
+        return _plan_cache
 
-    response = client.models.generate_content(
-        model=GEMINI_MODEL,
-        contents=prompt
-    )
 
-    raw_text = response.text.strip()
+def generate_research_plan(user_query: str, cache: PlanCache = None, use_cache: bool = True) -> Dict[str, Any]:
+    """
+    Turn a user query into a research plan, reusing cached plans.
+
+    Args:
+        user_query: Natural language user query
+        cache: Plan cache (default: get_plan_cache())
+        use_cache: Set False to always ask Gemini
+
+    Returns:
+        Research plan dictionary
+    """
+    if not use_cache:
+        return plan_with_gemini(user_query)
+
+    cache = cache or get_plan_cache()
+    plan = cache.get_or_create(user_query, plan_with_gemini)
+    logger.info(f"Plan cache: {cache.stats()}")
+    return plan
+
+
+def plan_with_gemini(user_query: str) -> Dict[str, Any]:
+    prompt = build_prompt(user_query)
+
+    # Concurrency, retries and deadlines are handled by the shared gateway
+    raw_text = get_gateway().generate(prompt, model=GEMINI_MODEL).strip()
 
     # Remove markdown fences if Gemini adds them
     if raw_text.startswith("```"):
@@ -73,18 +123,20 @@ def generate_research_plan(user_query: str) -> Dict[str, Any]:
 
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python query_planner_agent.py \"<user query>\"")
+        print("Usage: python query_planner_agent.py \"<user query>\" [output.json]")
         sys.exit(1)
 
     user_query = sys.argv[1]
+    output_file = sys.argv[2] if len(sys.argv) > 2 else OUTPUT_FILE
 
     try:
-        plan = generate_research_plan(user_query)
+        # The cache is in-memory, so a one-shot process can never hit it
+        plan = generate_research_plan(user_query, use_cache=False)
 
-        with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
+        with open(output_file, "w", encoding="utf-8") as f:
             json.dump(plan, f, indent=2, ensure_ascii=False)
 
-        print(f"Saved research plan to {OUTPUT_FILE}")
+        print(f"Saved research plan to {output_file}")
 
     except Exception as e:
         print("Error generating research plan:")
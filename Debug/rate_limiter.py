@@ -0,0 +1,147 @@
+import logging
+import threading
+import time
+from typing import Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+# Reddit's documented budgets; the X-Ratelimit-* headers override these
+PUBLIC_REQUESTS_PER_MINUTE = 30.0
+OAUTH_REQUESTS_PER_MINUTE = 100.0
+
+
+class RateLimiter:
+    """
+    Token bucket that adapts to Reddit's rate limit headers.
+
+    Until Reddit reports a budget, requests are paced by a plain token
+    bucket. Once X-Ratelimit-Remaining / X-Ratelimit-Reset are seen, the
+    reported remaining budget is spent as fast as callers ask for it and
+    callers wait only when it runs out before the window resets. A 429
+    blocks every caller for Retry-After (or an exponential backoff).
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = PUBLIC_REQUESTS_PER_MINUTE,
+        burst: int = 5,
+        max_backoff: float = 60.0,
+    ):
+        """
+        Initialize limiter.
+
+        Args:
+            requests_per_minute: Fallback rate before any headers are seen
+            burst: Bucket capacity for the fallback rate (default 5)
+            max_backoff: Upper bound in seconds for 429 backoff (default 60)
+        """
+        self.rate = requests_per_minute / 60.0
+        self.capacity = float(burst)
+        self.max_backoff = max_backoff
+
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+
+        # Budget reported by Reddit for the current window
+        self._window_remaining: Optional[float] = None
+        self._window_reset_at: Optional[float] = None
+
+        self._blocked_until = 0.0
+        self._consecutive_429 = 0
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._last_refill
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._last_refill = now
+
+    def acquire(self) -> None:
+        """Block until one request may be sent."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                elif self._window_reset_at is not None and now < self._window_reset_at:
+                    if self._window_remaining >= 1:
+                        self._window_remaining -= 1
+                        return
+                    wait = self._window_reset_at - now
+                else:
+                    self._window_reset_at = None
+                    self._window_remaining = None
+                    self._refill(now)
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+    def update(self, headers: Mapping[str, str], status_code: int = 200) -> None:
+        """
+        Adapt to a response's rate limit headers.
+
+        Args:
+            headers: Response headers (case-insensitive mapping)
+            status_code: HTTP status of the response
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            if status_code == 429:
+                self._consecutive_429 += 1
+                retry_after = _parse_float(headers.get("Retry-After"))
+                if retry_after is None:
+                    retry_after = min(self.max_backoff, 2.0 ** self._consecutive_429)
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+                logger.warning(f"Rate limited by Reddit, backing off {retry_after:.1f}s")
+                return
+
+            self._consecutive_429 = 0
+
+            remaining = _parse_float(headers.get("X-Ratelimit-Remaining"))
+            reset = _parse_float(headers.get("X-Ratelimit-Reset"))
+            if remaining is None or reset is None:
+                return
+
+            reset_at = now + reset
+            same_window = (
+                self._window_reset_at is not None
+                and abs(reset_at - self._window_reset_at) < 2.0
+            )
+            if same_window:
+                # Responses can arrive out of order; trust the lowest count
+                remaining = min(remaining, self._window_remaining)
+
+            self._window_remaining = remaining
+            self._window_reset_at = reset_at
+
+
+def _parse_float(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+_shared_limiter: Optional[RateLimiter] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_limiter(requests_per_minute: float = PUBLIC_REQUESTS_PER_MINUTE) -> RateLimiter:
+    """
+    Return the process-wide limiter, creating it on first use.
+
+    Args:
+        requests_per_minute: Fallback rate used only when creating the limiter
+
+    Returns:
+        Shared RateLimiter instance
+    """
+    global _shared_limiter
+    with _shared_lock:
+        if _shared_limiter is None:
+            _shared_limiter = RateLimiter(requests_per_minute=requests_per_minute)
+        return _shared_limiter
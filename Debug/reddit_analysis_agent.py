@@ -1,23 +1,46 @@
 import json
+import logging
 import os
 import sys
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Dict, Any
 
-from google import genai
-from google.genai import types
-from vector_store import VectorStore
+from clustering import Cluster, cluster_documents
+from llm_gateway import get_gateway
+from prompt_packer import estimate_tokens, pack, pack_chunks, truncate_to_tokens
+from vector_store import VectorStore, build_where, get_vector_store
 
-vector_store = VectorStore()
+logger = logging.getLogger(__name__)
 
 
 # ---------------- CONFIG ---------------- #
 
-# Initialize client with API key
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
-
 # Correct model name for google.genai package
 GEMINI_MODEL = "gemini-2.5-flash"
 
+# Retrieval: MMR keeps RETRIEVAL_K of MMR_FETCH_K nearest documents, trading
+# relevance against redundancy by MMR_LAMBDA (1.0 = plain nearest neighbours)
+RETRIEVAL_K = 10
+MMR_FETCH_K = int(os.getenv("MMR_FETCH_K", "40"))
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.5"))
+
+# Token budget for the DISCUSSIONS block, and the cap for any single item
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "2000"))
+PROMPT_ITEM_TOKENS = 300
+
+# "single" sends one prompt; "map_reduce" analyzes up to MAP_REDUCE_MAX_DOCS
+# documents in prompt-sized chunks with at most MAP_REDUCE_CONCURRENCY calls in flight
+ANALYSIS_MODE = os.getenv("ANALYSIS_MODE", "single")
+MAP_REDUCE_MAX_DOCS = int(os.getenv("MAP_REDUCE_MAX_DOCS", "2000"))
+MAP_REDUCE_CONCURRENCY = int(os.getenv("MAP_REDUCE_CONCURRENCY", "4"))
+
+# "cluster" groups up to CLUSTER_MAX_DOCS documents locally and sends only
+# exemplars to the LLM; CLUSTER_COUNT=0 picks the cluster count automatically
+CLUSTER_MAX_DOCS = int(os.getenv("CLUSTER_MAX_DOCS", "5000"))
+CLUSTER_COUNT = int(os.getenv("CLUSTER_COUNT", "0"))
+CLUSTER_EXEMPLARS = 3
+EXEMPLAR_TOKENS = 60
+
 
 # ---------------- HELPERS ---------------- #
 
@@ -40,28 +63,63 @@ GEMINI_MODEL = "gemini-2.5-flash"
 
    # return texts
 
-def retrieve_context(query: str):
-    results = vector_store.search(query, k=10)
-    return results["documents"][0]
+def request_post_ids(ingestion_output: Dict[str, Any]) -> List[str]:
+    """
+    Return the ids of the posts this request ingested.
+    """
+    return sorted({
+        post["id"]
+        for item in ingestion_output.get("results", [])
+        for post in item.get("posts", [])
+        if post.get("id")
+    })
 
 
-def build_prompt(text_blocks: List[str], business_context: str) -> str:
+def request_scope(ingestion_output: Dict[str, Any], **filters) -> Dict[str, Any]:
     """
-    Build a controlled Gemini prompt for business insight extraction.
+    Build a vector store filter limited to the posts this request ingested,
+    so concurrent requests sharing one store never see each other's data.
+
+    Extra `filters` (subreddits, doc_type, min_score, since_utc) narrow
+    the slice further; see vector_store.build_where.
     """
-    MAX_CHARS = 8000
+    return build_where(post_ids=request_post_ids(ingestion_output), **filters)
 
-    joined = []
-    total = 0
-    for t in text_blocks:
-        if total + len(t) > MAX_CHARS:
-            break
-        joined.append(f"- {t}")
-        total += len(t)
 
-    joined_text = "\n".join(joined)
+def retrieve_context(
+    query: str,
+    store: VectorStore = None,
+    where: Dict[str, Any] = None,
+    k: int = RETRIEVAL_K,
+    fetch_k: int = MMR_FETCH_K,
+    lambda_mult: float = MMR_LAMBDA
+):
+    """
+    Retrieve `k` relevant but mutually distinct documents for the prompt.
 
-    return f"""
+    Near-duplicate comments would otherwise fill the prompt budget with
+    the same point; see VectorStore.search_mmr.
+    """
+    store = store or get_vector_store()
+    results = store.search_mmr(query, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult, where=where)
+    return results["documents"][0]
+
+
+def build_prompt(
+    text_blocks: List[str],
+    business_context: str,
+    token_budget: int = PROMPT_TOKEN_BUDGET
+) -> str:
+    """
+    Build a controlled Gemini prompt for business insight extraction.
+
+    Discussions are packed in rank order into `token_budget` tokens;
+    see prompt_packer.pack.
+    """
+    packed = pack(text_blocks, token_budget, max_item_tokens=PROMPT_ITEM_TOKENS)
+    joined_text = "\n".join(packed.items)
+
+    prompt = f"""
 You are an AI analyst helping small businesses understand real customer demand.
 BUSINESS CONTEXT:
 {business_context}
@@ -94,42 +152,44 @@ OUTPUT FORMAT (STRICT JSON ONLY):
 DISCUSSIONS:
 {joined_text}
 """
+    logger.info(f"Prompt discussions: {packed.summary()}; prompt ~{estimate_tokens(prompt)} tokens")
+    return prompt
 
 
-def run_analysis(ingestion_output: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Run Gemini analysis and parse structured output.
-    """
-    business_context = ingestion_output.get("business_description", "")
+def call_gemini(prompt: str) -> str:
+    """Send one prompt to Gemini and return the raw response text."""
+    # Concurrency, retries and deadlines are handled by the shared gateway
+    return get_gateway().generate(prompt, model=GEMINI_MODEL)
 
-    query = " ".join(ingestion_output.get("query", []))
-    text_blocks = retrieve_context(query)
 
+def parse_llm_json(raw_text: str) -> Dict[str, Any]:
+    raw_text = raw_text.strip()
 
-    if not text_blocks:
-        return {
-            "themes": [],
-            "overall_summary": "No meaningful discussion data found."
-        }
+    # Handle markdown-wrapped JSON
+    if raw_text.startswith("```"):
+        raw_text = raw_text.strip("`")
+        raw_text = raw_text.replace("json", "", 1).strip()
+
+    return json.loads(raw_text)
 
-    prompt = build_prompt(text_blocks, business_context)
 
+def ask_llm(prompt: str, llm: Callable[[str], str] = None) -> Dict[str, Any]:
+    """
+    Send a prompt and parse the JSON answer.
+
+    Args:
+        prompt: Prompt text
+        llm: Callable taking a prompt and returning raw text (default: call_gemini)
+
+    Returns:
+        Parsed JSON, or a dict with an "error" key
+    """
+    llm = llm or call_gemini
+    raw_text = ""
     try:
-        # Use the correct google.genai API
-        response = client.models.generate_content(
-            model=GEMINI_MODEL,
-            contents=prompt
-        )
-        
-        raw_text = response.text.strip()
-
-        # Handle markdown-wrapped JSON
-        if raw_text.startswith("```"):
-            raw_text = raw_text.strip("`")
-            raw_text = raw_text.replace("json", "", 1).strip()
-
-        return json.loads(raw_text)
-        
+        raw_text = llm(prompt)
+        return parse_llm_json(raw_text)
+
     except json.JSONDecodeError:
         return {
             "error": "Failed to parse Gemini output",
@@ -142,6 +202,317 @@ def run_analysis(ingestion_output: Dict[str, Any]) -> Dict[str, Any]:
         }
 
 
+def build_reduce_prompt(candidates: List[Dict[str, Any]], business_context: str) -> str:
+    """
+    Build the prompt that merges per-chunk themes into one theme list.
+    """
+    numbered = [
+        {
+            "id": i,
+            "theme": t.get("theme", ""),
+            "key_pain_points": t.get("key_pain_points", []),
+            "recommended_actions": t.get("recommended_actions", [])
+        }
+        for i, t in enumerate(candidates)
+    ]
+
+    return f"""
+You are an AI analyst helping small businesses understand real customer demand.
+BUSINESS CONTEXT:
+{business_context}
+
+Below are themes extracted independently from separate batches of customer discussions.
+The same theme may appear several times under different wording.
+
+TASK:
+1. Merge themes that describe the same concern; list the ids of every merged theme in "source_ids".
+2. Combine and deduplicate their pain points and recommended actions.
+3. Write an overall summary across all themes.
+
+IMPORTANT:
+- Every input id must appear in exactly one output theme.
+- Do NOT mention Reddit or sources in the output.
+- Be practical and concise.
+
+OUTPUT FORMAT (STRICT JSON ONLY):
+{{
+  "themes": [
+    {{
+      "theme": "",
+      "source_ids": [],
+      "key_pain_points": [],
+      "recommended_actions": []
+    }}
+  ],
+  "overall_summary": ""
+}}
+
+THEMES:
+{json.dumps(numbered, ensure_ascii=False, indent=1)}
+"""
+
+
+def merge_themes(candidates: List[Dict[str, Any]], reduced: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Apply the reduce call's grouping to the per-chunk themes.
+
+    evidence_count is summed from the source themes here rather than
+    trusted from the model. Themes the reduce call left out are kept as-is.
+    """
+    themes = []
+    used = set()
+
+    for merged in reduced.get("themes", []):
+        ids = [
+            i for i in merged.get("source_ids", [])
+            if isinstance(i, int) and 0 <= i < len(candidates) and i not in used
+        ]
+        if not ids:
+            continue
+        used.update(ids)
+
+        sources = [candidates[i] for i in ids]
+        themes.append({
+            "theme": merged.get("theme") or sources[0].get("theme", ""),
+            "evidence_count": sum(int(t.get("evidence_count", 0) or 0) for t in sources),
+            "key_pain_points": merged.get("key_pain_points") or list(dict.fromkeys(
+                p for t in sources for p in t.get("key_pain_points", [])
+            )),
+            "recommended_actions": merged.get("recommended_actions") or list(dict.fromkeys(
+                a for t in sources for a in t.get("recommended_actions", [])
+            ))
+        })
+
+    themes.extend(t for i, t in enumerate(candidates) if i not in used)
+    themes.sort(key=lambda t: int(t.get("evidence_count", 0) or 0), reverse=True)
+
+    return {
+        "themes": themes,
+        "overall_summary": reduced.get("overall_summary", "")
+    }
+
+
+def run_map_reduce(
+    text_blocks: List[str],
+    business_context: str,
+    llm: Callable[[str], str] = None,
+    max_concurrency: int = MAP_REDUCE_CONCURRENCY
+) -> Dict[str, Any]:
+    """
+    Analyze any number of texts: one theme extraction per prompt-sized
+    chunk (at most `max_concurrency` in flight), then one merge call.
+    """
+    chunks = pack_chunks(text_blocks, PROMPT_TOKEN_BUDGET, max_item_tokens=PROMPT_ITEM_TOKENS)
+    prompts = [build_prompt(chunk, business_context) for chunk in chunks]
+
+    workers = max(1, min(max_concurrency, len(prompts)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        mapped = list(pool.map(lambda p: ask_llm(p, llm), prompts))
+
+    logger.info(f"Map-reduce: {len(text_blocks)} texts in {len(chunks)} chunks")
+    return reduce_themes(mapped, business_context, llm=llm)
+
+
+def reduce_themes(
+    mapped: List[Dict[str, Any]],
+    business_context: str,
+    llm: Callable[[str], str] = None
+) -> Dict[str, Any]:
+    """
+    Merge per-chunk analysis results with one reduce call.
+
+    Args:
+        mapped: One parsed theme-extraction result (or error dict) per chunk
+        business_context: Business description for the reduce prompt
+        llm: Optional replacement for the Gemini call
+
+    Returns:
+        Merged analysis result
+    """
+    failed = [m for m in mapped if "error" in m]
+    candidates = [t for m in mapped if "error" not in m for t in m.get("themes", [])]
+    logger.info(
+        f"Reduce: {len(mapped)} chunks, {len(failed)} failed, {len(candidates)} candidate themes"
+    )
+
+    if not candidates:
+        return failed[0] if failed else {
+            "themes": [],
+            "overall_summary": "No meaningful discussion data found."
+        }
+    if len(mapped) == 1:
+        return mapped[0]
+
+    reduced = ask_llm(build_reduce_prompt(candidates, business_context), llm)
+    if "error" in reduced:
+        logger.warning(f"Reduce call failed, returning unmerged themes: {reduced['error']}")
+        reduced = {}
+
+    return merge_themes(candidates, reduced)
+
+
+def build_cluster_prompt(clusters: List[Cluster], business_context: str) -> str:
+    """
+    Build the prompt that names pre-computed comment clusters.
+    """
+    groups = [
+        {
+            "id": i,
+            "size": cluster.size,
+            "examples": [truncate_to_tokens(e, EXEMPLAR_TOKENS) for e in cluster.exemplars]
+        }
+        for i, cluster in enumerate(clusters)
+    ]
+
+    return f"""
+You are an AI analyst helping small businesses understand real customer demand.
+BUSINESS CONTEXT:
+{business_context}
+
+Real user comments from public online discussions were grouped by similarity.
+Each group below lists its size and its most typical comments.
+
+TASK:
+1. Name the concern each group expresses as a short theme.
+2. Groups expressing the same concern must use the same theme name.
+3. Extract key pain points and suggest concrete, actionable business actions per group.
+
+IMPORTANT:
+- Do NOT mention Reddit or sources in the output.
+- Be practical and concise.
+
+OUTPUT FORMAT (STRICT JSON ONLY):
+{{
+  "clusters": [
+    {{
+      "id": 0,
+      "theme": "",
+      "key_pain_points": [],
+      "recommended_actions": []
+    }}
+  ],
+  "overall_summary": ""
+}}
+
+CLUSTERS:
+{json.dumps(groups, ensure_ascii=False, indent=1)}
+"""
+
+
+def label_clusters(clusters: List[Cluster], labeled: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Turn LLM cluster labels into themes with exact evidence counts.
+
+    evidence_count is the number of comments in the clusters sharing a
+    theme name, counted locally. Unlabeled clusters are named after
+    their first exemplar.
+    """
+    labels = {
+        c.get("id"): c for c in labeled.get("clusters", []) if isinstance(c, dict)
+    }
+
+    themes: Dict[str, Dict[str, Any]] = {}
+    for i, cluster in enumerate(clusters):
+        label = labels.get(i, {})
+        name = (label.get("theme") or truncate_to_tokens(cluster.exemplars[0], 12)).strip()
+        theme = themes.setdefault(name.lower(), {
+            "theme": name,
+            "evidence_count": 0,
+            "key_pain_points": [],
+            "recommended_actions": []
+        })
+        theme["evidence_count"] += cluster.size
+        for key in ("key_pain_points", "recommended_actions"):
+            theme[key] = list(dict.fromkeys(theme[key] + list(label.get(key, []))))
+
+    return {
+        "themes": sorted(themes.values(), key=lambda t: t["evidence_count"], reverse=True),
+        "overall_summary": labeled.get("overall_summary", "")
+    }
+
+
+def run_clustered(
+    scope: Dict[str, Any],
+    business_context: str,
+    store: VectorStore = None,
+    llm: Callable[[str], str] = None
+) -> Dict[str, Any]:
+    """
+    Cluster every document in `scope` by embedding, then make one LLM call
+    to name the clusters from their exemplars.
+    """
+    store = store or get_vector_store()
+    docs = store.fetch(where=scope, limit=CLUSTER_MAX_DOCS)
+    clusters = cluster_documents(
+        docs["ids"],
+        docs["documents"],
+        docs["embeddings"],
+        k=CLUSTER_COUNT or None,
+        exemplars=CLUSTER_EXEMPLARS
+    )
+
+    if not clusters:
+        return {
+            "themes": [],
+            "overall_summary": "No meaningful discussion data found."
+        }
+
+    labeled = ask_llm(build_cluster_prompt(clusters, business_context), llm)
+    if "error" in labeled:
+        return labeled
+
+    return label_clusters(clusters, labeled)
+
+
+def run_analysis(
+    ingestion_output: Dict[str, Any],
+    store: VectorStore = None,
+    filters: Dict[str, Any] = None,
+    mode: str = None,
+    llm: Callable[[str], str] = None,
+    max_concurrency: int = MAP_REDUCE_CONCURRENCY
+) -> Dict[str, Any]:
+    """
+    Run Gemini analysis and parse structured output.
+
+    Pass `store` to query the vector store the ingestion step wrote to.
+    Retrieval only sees this request's posts; `filters` holds extra
+    build_where() keywords, e.g. {"subreddits": ["smallbusiness"], "min_score": 5}.
+
+    `mode` is "single" (one prompt over the top retrieved documents),
+    "map_reduce" (up to MAP_REDUCE_MAX_DOCS documents, see run_map_reduce)
+    or "cluster" (exact counts from local clustering, see run_clustered);
+    default $ANALYSIS_MODE. `llm` replaces the Gemini call, e.g. with
+    stubs.FakeLLM for offline runs.
+    """
+    mode = mode or ANALYSIS_MODE
+    business_context = ingestion_output.get("business_description", "")
+
+    query = " ".join(ingestion_output.get("query", []))
+    text_blocks = []
+    if request_post_ids(ingestion_output):
+        scope = request_scope(ingestion_output, **(filters or {}))
+        if mode == "cluster":
+            return run_clustered(scope, business_context, store=store, llm=llm)
+        if mode == "map_reduce":
+            store = store or get_vector_store()
+            text_blocks = store.search(query, k=MAP_REDUCE_MAX_DOCS, where=scope)["documents"][0]
+        else:
+            text_blocks = retrieve_context(query, store=store, where=scope)
+
+
+    if not text_blocks:
+        return {
+            "themes": [],
+            "overall_summary": "No meaningful discussion data found."
+        }
+
+    if mode == "map_reduce":
+        return run_map_reduce(text_blocks, business_context, llm=llm, max_concurrency=max_concurrency)
+
+    return ask_llm(build_prompt(text_blocks, business_context), llm)
+
+
 # ---------------- CLI ENTRY ---------------- #
 
 def main():
@@ -1,20 +1,76 @@
 
 import base64
+import json
 import logging
 import os
-import time
-from typing import Dict, List, Any
+from collections import deque
+from typing import Dict, Iterator, List, Any, Optional
 
 import requests
 
+from http_session import build_session
+from rate_limiter import (
+    OAUTH_REQUESTS_PER_MINUTE,
+    PUBLIC_REQUESTS_PER_MINUTE,
+    RateLimiter,
+    get_shared_limiter,
+)
+from response_cache import ResponseCache
+
 logger = logging.getLogger(__name__)
 
 
 class RedditClient:
     """Client for interacting with Reddit API via HTTP requests."""
 
-    def __init__(self):
-        """Initialize Reddit client - uses OAuth if available, otherwise public endpoints."""
+    # Retries of a single call after Reddit answers 429
+    MAX_RATE_LIMIT_RETRIES = 3
+
+    # Reddit's cap on ids per /api/morechildren call
+    MORECHILDREN_BATCH_SIZE = 100
+
+    def __init__(
+        self,
+        base_url: str = None,
+        rate_limiter: RateLimiter = None,
+        session: requests.Session = None,
+        pool_size: int = 10,
+        max_retries: int = 3,
+        backoff_factor: float = 0.5,
+        gzip: bool = True,
+        cache: ResponseCache = None,
+        use_cache: bool = True,
+        expand_more: bool = False,
+        more_budget: int = 300,
+    ):
+        """
+        Initialize Reddit client - uses OAuth if available, otherwise public endpoints.
+
+        Args:
+            base_url: Override the API host (e.g. a local stub server)
+            rate_limiter: Limiter to pace requests (default: the process-wide shared one)
+            session: Pre-built HTTP session; the pool options below are ignored if given
+            pool_size: Keep-alive connections per host (default 10)
+            max_retries: Retries for connection errors and 5xx responses (default 3)
+            backoff_factor: Base backoff between retries, in seconds (default 0.5)
+            gzip: Request gzip-compressed responses (default True)
+            cache: Response cache (default: SQLite file at $REDDIT_CACHE_PATH)
+            use_cache: Set False to always hit Reddit
+            expand_more: Resolve "load more comments" stubs via /api/morechildren
+            more_budget: Maximum stub comment ids resolved per post (default 300)
+        """
+        self.session = session or build_session(
+            pool_size=pool_size,
+            max_retries=max_retries,
+            backoff_factor=backoff_factor,
+            gzip=gzip,
+        )
+        if cache is None and use_cache:
+            cache = ResponseCache(os.getenv("REDDIT_CACHE_PATH", "./reddit_cache.sqlite"))
+        self.cache = cache
+        self.expand_more = expand_more
+        self.more_budget = more_budget
+        self.base_url = base_url.rstrip("/") if base_url else None
         self.client_id = os.getenv("REDDIT_CLIENT_ID")
         self.client_secret = os.getenv("REDDIT_CLIENT_SECRET")
         self.user_agent = os.getenv("REDDIT_USER_AGENT", "AIMS Reddit Ingestion Service 1.0")
@@ -35,6 +91,68 @@ class RedditClient:
         else:
             logger.info("Reddit client initialized with public endpoints (no credentials needed)")
 
+        self.rate_limiter = rate_limiter or get_shared_limiter(
+            OAUTH_REQUESTS_PER_MINUTE if self.use_oauth else PUBLIC_REQUESTS_PER_MINUTE
+        )
+
+    def _url(self, path: str) -> str:
+        """Build an API URL for the configured host."""
+        if self.base_url:
+            return f"{self.base_url}{path}"
+        if self.use_oauth:
+            return f"https://oauth.reddit.com{path}"
+        return f"https://www.reddit.com{path}"
+
+    def _get_json(self, url: str, params: Dict[str, Any], endpoint: Optional[str] = None) -> Any:
+        """
+        GET a Reddit JSON endpoint through the cache and rate limiter.
+
+        Args:
+            url: Endpoint URL
+            params: Query parameters
+            endpoint: Cache endpoint name ("search", "comments"); None skips the cache
+
+        Returns:
+            Decoded JSON payload
+        """
+        cached = None
+        headers = self.headers
+        if self.cache is not None and endpoint:
+            cached = self.cache.lookup(endpoint, url, params)
+            if cached is not None and cached.fresh:
+                return json.loads(cached.body)
+            if cached is not None:
+                headers = dict(self.headers)
+                if cached.etag:
+                    headers["If-None-Match"] = cached.etag
+                if cached.last_modified:
+                    headers["If-Modified-Since"] = cached.last_modified
+
+        for _ in range(self.MAX_RATE_LIMIT_RETRIES + 1):
+            self.rate_limiter.acquire()
+            response = self.session.get(
+                url, headers=headers, params=params, timeout=10
+            )
+            self.rate_limiter.update(response.headers, response.status_code)
+            if response.status_code != 429:
+                break
+
+        if response.status_code == 304 and cached is not None:
+            self.cache.refresh(cached.key)
+            return json.loads(cached.body)
+
+        response.raise_for_status()
+        if self.cache is not None and endpoint:
+            self.cache.store(
+                endpoint,
+                url,
+                params,
+                response.content,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+            )
+        return response.json()
+
     def _get_access_token(self) -> str:
         """Get OAuth access token from Reddit."""
         auth_string = f"{self.client_id}:{self.client_secret}"
@@ -48,7 +166,7 @@ class RedditClient:
 
         data = {"grant_type": "client_credentials"}
 
-        response = requests.post(
+        response = self.session.post(
             "https://www.reddit.com/api/v1/access_token",
             headers=headers,
             data=data,
@@ -74,10 +192,7 @@ class RedditClient:
             List of post dictionaries
         """
         try:
-            if self.use_oauth:
-                url = f"https://oauth.reddit.com/r/{subreddit_name}/search.json"
-            else:
-                url = f"https://www.reddit.com/r/{subreddit_name}/search.json"
+            url = self._url(f"/r/{subreddit_name}/search.json")
 
             params = {
                 "q": query,
@@ -87,11 +202,7 @@ class RedditClient:
                 "type": "link"
             }
 
-            response = requests.get(
-                url, headers=self.headers, params=params, timeout=10
-            )
-            response.raise_for_status()
-            data = response.json()
+            data = self._get_json(url, params, endpoint="search")
 
             posts = []
             for child in data.get("data", {}).get("children", []):
@@ -100,7 +211,6 @@ class RedditClient:
                 post_data = child["data"]
                 posts.append(post_data)
 
-            time.sleep(3.0 if not self.use_oauth else 1.0)
             logger.info(f"Searched r/{subreddit_name} with query '{query}': found {len(posts)} posts")
             return posts
 
@@ -117,44 +227,122 @@ class RedditClient:
             subreddit: Subreddit name
 
         Returns:
-            List of comment dictionaries
+            List of slim comment records (id, body, score, depth)
         """
-        try:
-            if self.use_oauth:
-                url = f"https://oauth.reddit.com/r/{subreddit}/comments/{post_id}.json"
-            else:
-                url = f"https://www.reddit.com/r/{subreddit}/comments/{post_id}.json"
+        comments = list(self.iter_comments(post_id, subreddit))
+        logger.debug(f"Fetched {len(comments)} comments for post {post_id}")
+        return comments
 
-            response = requests.get(
-                url, headers=self.headers, params={"limit": 500}, timeout=10
-            )
-            response.raise_for_status()
-            data = response.json()
+    def iter_comments(self, post_id: str, subreddit: str) -> Iterator[Dict[str, Any]]:
+        """
+        Fetch a submission's comments and yield them one at a time.
 
-            comments = []
-            if len(data) > 1:
-                comment_tree = data[1]["data"]["children"]
-                comments = self._extract_comments(comment_tree)
+        Feed this straight into CommentRanker to keep only the top N
+        without materializing every comment. With expand_more, comments
+        hidden behind "more" stubs are resolved afterwards in batches.
+
+        Args:
+            post_id: Reddit post ID
+            subreddit: Subreddit name
+
+        Yields:
+            Slim comment records (id, body, score, depth) in thread order
+        """
+        more_ids = [] if self.expand_more else None
+
+        # Parsing stays inside the try: a 200 body can be an error object
+        # ({"message": ..., "error": 403}) rather than a listing pair
+        try:
+            url = self._url(f"/r/{subreddit}/comments/{post_id}.json")
+            data = self._get_json(url, {"limit": 500}, endpoint="comments")
 
-            logger.debug(f"Fetched {len(comments)} comments for post {post_id}")
-            return comments
+            if len(data) > 1:
+                yield from self._extract_comments(data[1]["data"]["children"], more_ids)
 
+            if more_ids:
+                yield from self._expand_more(post_id, more_ids)
         except Exception as e:
             logger.error(f"Error fetching comments for post {post_id}: {e}")
-            return []
 
-    def _extract_comments(self, tree: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Recursively extract comments from Reddit's nested structure."""
-        comments = []
+    def _expand_more(self, post_id: str, more_ids: List[str]) -> Iterator[Dict[str, Any]]:
+        """
+        Resolve "more" stub ids with batched /api/morechildren calls.
+
+        Stubs nested inside the returned comments are queued too, until
+        more_budget ids have been requested.
+
+        Args:
+            post_id: Reddit post ID
+            more_ids: Comment ids collected from "more" stubs
 
-        for item in tree:
-            if item["kind"] == "t1":
-                comment_data = item["data"]
-                comments.append(comment_data)
+        Yields:
+            Slim comment records for the resolved comments
+        """
+        pending = deque(more_ids)
+        budget = self.more_budget
+        url = self._url("/api/morechildren.json")
 
-                if "replies" in comment_data and comment_data["replies"]:
-                    if isinstance(comment_data["replies"], dict):
-                        replies_tree = comment_data["replies"]["data"]["children"]
-                        comments.extend(self._extract_comments(replies_tree))
+        while pending and budget > 0:
+            batch_size = min(self.MORECHILDREN_BATCH_SIZE, budget, len(pending))
+            batch = [pending.popleft() for _ in range(batch_size)]
+            budget -= batch_size
 
-        return comments
+            params = {
+                "api_type": "json",
+                "link_id": f"t3_{post_id}",
+                "children": ",".join(batch),
+                "limit_children": "false",
+            }
+            try:
+                data = self._get_json(url, params, endpoint="morechildren")
+            except Exception as e:
+                logger.error(f"Error expanding more comments for post {post_id}: {e}")
+                return
+
+            things = data.get("json", {}).get("data", {}).get("things", [])
+            nested_more = []
+            yield from self._extract_comments(things, nested_more)
+            pending.extend(nested_more)
+
+        if pending:
+            logger.debug(f"More-comments budget spent for post {post_id}, {len(pending)} ids left")
+
+    @staticmethod
+    def _extract_comments(
+        tree: List[Dict[str, Any]], more_ids: Optional[List[str]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Walk Reddit's nested reply tree depth-first with an explicit stack.
+
+        Yields comments in the same pre-order as a recursive walk, but deep
+        threads cannot hit the recursion limit and only the fields the
+        ranker needs are kept. When `more_ids` is given, the child ids of
+        every "more" stub are appended to it instead of being dropped.
+        """
+        stack = [iter(tree)]
+
+        while stack:
+            item = next(stack[-1], None)
+            if item is None:
+                stack.pop()
+                continue
+
+            if item.get("kind") == "more":
+                if more_ids is not None:
+                    more_ids.extend(item.get("data", {}).get("children", []))
+                continue
+
+            if item.get("kind") != "t1":
+                continue
+
+            comment_data = item["data"]
+            yield {
+                "id": comment_data.get("id", ""),
+                "body": comment_data.get("body", ""),
+                "score": comment_data.get("score", 0),
+                "depth": comment_data.get("depth", len(stack) - 1),
+            }
+
+            replies = comment_data.get("replies")
+            if isinstance(replies, dict):
+                stack.append(iter(replies.get("data", {}).get("children", [])))
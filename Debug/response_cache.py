@@ -0,0 +1,193 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Seconds a cached payload is served without asking Reddit again
+DEFAULT_TTLS = {
+    "search": 600,
+    "comments": 300,
+    "morechildren": 300,
+}
+
+
+@dataclass
+class CachedResponse:
+    key: str
+    body: bytes
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fresh: bool
+
+
+class ResponseCache:
+    """
+    Persistent SQLite cache for Reddit JSON responses.
+
+    Entries expire per endpoint TTL; expired entries keep their ETag /
+    Last-Modified so the client can revalidate with a conditional GET.
+    Total body size is bounded and the least recently used entries are
+    evicted first.
+    """
+
+    def __init__(
+        self,
+        path: str = "./reddit_cache.sqlite",
+        ttls: Dict[str, float] = None,
+        max_bytes: int = 200 * 1024 * 1024,
+    ):
+        """
+        Initialize cache.
+
+        Args:
+            path: SQLite database file
+            ttls: Seconds each endpoint stays fresh (defaults to DEFAULT_TTLS)
+            max_bytes: Upper bound on stored body bytes before LRU eviction
+        """
+        self.path = path
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                endpoint TEXT NOT NULL,
+                body BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(url: str, params: Dict[str, Any]) -> str:
+        canonical = json.dumps([url, sorted((params or {}).items())], default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def lookup(self, endpoint: str, url: str, params: Dict[str, Any]) -> Optional[CachedResponse]:
+        """
+        Find a cached response.
+
+        Args:
+            endpoint: Endpoint name used for the TTL ("search", "comments", ...)
+            url: Request URL
+            params: Query parameters
+
+        Returns:
+            CachedResponse (possibly stale) or None on a miss
+        """
+        key = self.make_key(url, params)
+        now = time.time()
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, etag, last_modified, stored_at FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            body, etag, last_modified, stored_at = row
+            fresh = now - stored_at < self.ttls.get(endpoint, 0)
+            if fresh:
+                self.hits += 1
+                self._conn.execute(
+                    "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+                )
+                self._conn.commit()
+            else:
+                self.misses += 1
+
+        return CachedResponse(key, body, etag, last_modified, fresh)
+
+    def refresh(self, key: str) -> None:
+        """Mark a stale entry fresh again after a 304 Not Modified."""
+        now = time.time()
+        with self._lock:
+            self.revalidated += 1
+            self._conn.execute(
+                "UPDATE responses SET stored_at = ?, accessed_at = ? WHERE key = ?",
+                (now, now, key),
+            )
+            self._conn.commit()
+
+    def store(
+        self,
+        endpoint: str,
+        url: str,
+        params: Dict[str, Any],
+        body: bytes,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> None:
+        """
+        Store a response body and evict old entries if over the size bound.
+
+        Args:
+            endpoint: Endpoint name used for the TTL
+            url: Request URL
+            params: Query parameters
+            body: Raw response body
+            etag: ETag header, if any
+            last_modified: Last-Modified header, if any
+        """
+        key = self.make_key(url, params)
+        now = time.time()
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, endpoint, body, etag, last_modified, now, now, len(body)),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        rows = self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY accessed_at ASC"
+        ).fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the current hit rate."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
@@ -0,0 +1,318 @@
+"""
+Offline stand-ins for Reddit and Gemini.
+
+Used by benchmark.py and the tests to exercise the pipeline without
+network access.
+"""
+import hashlib
+import json
+import ssl
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Any
+from urllib.parse import parse_qs, urlparse
+
+from pipeline import AnalysisPipeline
+from prompt_packer import estimate_tokens
+from reddit_analysis_agent import request_post_ids, request_scope, retrieve_context
+from vector_store import VectorStore
+
+EMBED_DIM = 64
+
+
+def stable_id(*parts: str) -> str:
+    """Short deterministic id for a tuple of strings."""
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()[:10]
+
+
+def stub_plan(query: str) -> Dict[str, Any]:
+    """Research plan derived from the query alone, no LLM call."""
+    return {
+        "business_description": query,
+        "target_subreddits": ["stubsub_a", "stubsub_b"],
+        "keywords": [f"{query} price", f"{query} quality"],
+        "posts_limit_per_subreddit": 5,
+    }
+
+
+def stub_posts(subreddit_name: str, query: str, limit: int, num_comments: int) -> List[Dict[str, Any]]:
+    """Synthetic search results; ids depend only on (subreddit, query, rank)."""
+    posts = []
+    for i in range(limit):
+        post_id = stable_id(subreddit_name, query, str(i))
+        posts.append({
+            "id": post_id,
+            "subreddit": subreddit_name,
+            "title": f"[{post_id}] {query} discussion {i}",
+            "permalink": f"/r/{subreddit_name}/comments/{post_id}/",
+            "score": 100 - i,
+            "num_comments": num_comments,
+        })
+    return posts
+
+
+def stub_comments(post_id: str, count: int) -> List[Dict[str, Any]]:
+    """Synthetic flat comment list for a post."""
+    return [
+        {"id": f"{post_id}_{j}", "body": f"[{post_id}] comment {j}", "score": j, "depth": 0}
+        for j in range(count)
+    ]
+
+
+class StubRedditClient:
+    """Returns synthetic posts and comments, optionally with simulated latency."""
+
+    def __init__(self, comments_per_post: int = 20, latency: float = 0.0):
+        self.comments_per_post = comments_per_post
+        self.latency = latency
+
+    def search_subreddit(
+        self, subreddit_name: str, query: str, limit: int = 5, sort: str = "relevance"
+    ) -> List[Dict[str, Any]]:
+        time.sleep(self.latency)
+        return stub_posts(subreddit_name, query, limit, self.comments_per_post)
+
+    def fetch_comments(self, post_id: str, subreddit: str) -> List[Dict[str, Any]]:
+        time.sleep(self.latency)
+        return stub_comments(post_id, self.comments_per_post)
+
+    def iter_comments(self, post_id: str, subreddit: str) -> Iterator[Dict[str, Any]]:
+        return iter(self.fetch_comments(post_id, subreddit))
+
+
+class _StubRedditHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; avoid delayed-ACK stalls
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        # One call per TCP connection; keep-alive requests loop inside it
+        self.server.stub.record_connection()
+        super().handle()
+
+    def _send_json(self, payload: Any, status: int = 200) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        stub = self.server.stub
+        stub.record_request()
+        time.sleep(stub.latency)
+
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        parts = url.path.strip("/").split("/")
+
+        # /r/{subreddit}/search.json
+        if len(parts) == 3 and parts[0] == "r" and parts[2] == "search.json":
+            limit = int(params.get("limit", ["5"])[0])
+            query = params.get("q", [""])[0]
+            posts = stub_posts(parts[1], query, limit, stub.comments_per_post)
+            self._send_json({"data": {"children": [{"kind": "t3", "data": p} for p in posts]}})
+            return
+
+        # /r/{subreddit}/comments/{post_id}.json
+        if len(parts) == 4 and parts[0] == "r" and parts[2] == "comments":
+            post_id = parts[3].replace(".json", "")
+            comments = stub_comments(post_id, stub.comments_per_post)
+            self._send_json([
+                {"data": {"children": [{"kind": "t3", "data": {"id": post_id}}]}},
+                {"data": {"children": [{"kind": "t1", "data": c} for c in comments]}},
+            ])
+            return
+
+        self._send_json({"error": 404}, status=404)
+
+
+class StubRedditServer:
+    """Local HTTP server speaking enough of Reddit's JSON API for RedditClient.
+
+    Use as a context manager and point RedditClient(base_url=server.url) at it.
+    Pass a certificate and key to serve HTTPS instead of plain HTTP.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        comments_per_post: int = 20,
+        certfile: str = None,
+        keyfile: str = None,
+    ):
+        self.latency = latency
+        self.comments_per_post = comments_per_post
+        self.request_count = 0
+        self.connection_count = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), _StubRedditHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.stub = self
+        self._thread = None
+
+        self.scheme = "http"
+        if certfile:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile, keyfile)
+            self._httpd.socket = context.wrap_socket(self._httpd.socket, server_side=True)
+            self.scheme = "https"
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"{self.scheme}://{host}:{port}"
+
+    def record_request(self) -> None:
+        with self._lock:
+            self.request_count += 1
+
+    def record_connection(self) -> None:
+        with self._lock:
+            self.connection_count += 1
+
+    def __enter__(self) -> "StubRedditServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class HashingVectorStore(VectorStore):
+    """VectorStore with a deterministic bag-of-words hash embedding.
+
+    `latency` is slept per embedded text, like a remote embedding API.
+    """
+
+    def __init__(self, latency: float = 0.0, **kwargs):
+        kwargs.setdefault("use_embedding_cache", False)
+        kwargs.setdefault("persistent", False)
+        super().__init__(**kwargs)
+        self.latency = latency
+
+    def _embed_remote(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency * len(texts))
+        vectors = []
+        for text in texts:
+            vec = [0.0] * EMBED_DIM
+            for token in text.lower().split():
+                vec[int(stable_id(token), 16) % EMBED_DIM] += 1.0
+            vectors.append(vec)
+        return vectors
+
+
+class FakeLLM:
+    """
+    Deterministic stand-in for the Gemini text call used by run_analysis.
+
+    Map prompts get one theme per distinct first word of the DISCUSSIONS
+    lines, with evidence_count = lines starting with that word. Reduce
+    prompts get themes with the same name merged, and cluster prompts get
+    each cluster named after the first word of its first example. Records
+    the number of calls, estimated prompt tokens and the peak number of
+    calls in flight.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt: str) -> str:
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += estimate_tokens(prompt)
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+        try:
+            time.sleep(self.latency)
+            if "\nTHEMES:\n" in prompt:
+                return json.dumps(self._reduce(prompt))
+            if "\nCLUSTERS:\n" in prompt:
+                return json.dumps(self._label(prompt))
+            return json.dumps(self._map(prompt))
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    @staticmethod
+    def _map(prompt: str) -> Dict[str, Any]:
+        discussions = prompt.split("DISCUSSIONS:", 1)[1]
+        counts: Dict[str, int] = {}
+        for line in discussions.splitlines():
+            if line.startswith("- ") and line[2:].split():
+                word = line[2:].split()[0].lower()
+                counts[word] = counts.get(word, 0) + 1
+        return {
+            "themes": [
+                {
+                    "theme": word,
+                    "evidence_count": n,
+                    "key_pain_points": [f"{word} pain"],
+                    "recommended_actions": [f"fix {word}"],
+                }
+                for word, n in counts.items()
+            ],
+            "overall_summary": f"{len(counts)} themes",
+        }
+
+    @staticmethod
+    def _reduce(prompt: str) -> Dict[str, Any]:
+        candidates = json.loads(prompt.split("\nTHEMES:\n", 1)[1])
+        groups: Dict[str, List[int]] = {}
+        for theme in candidates:
+            groups.setdefault(theme["theme"], []).append(theme["id"])
+        return {
+            "themes": [
+                {"theme": name, "source_ids": ids, "key_pain_points": [], "recommended_actions": []}
+                for name, ids in groups.items()
+            ],
+            "overall_summary": f"{len(groups)} themes",
+        }
+
+
+    @staticmethod
+    def _label(prompt: str) -> Dict[str, Any]:
+        groups = json.loads(prompt.split("\nCLUSTERS:\n", 1)[1])
+        return {
+            "clusters": [
+                {
+                    "id": group["id"],
+                    "theme": group["examples"][0].split()[0].lower(),
+                    "key_pain_points": [],
+                    "recommended_actions": [],
+                }
+                for group in groups
+            ],
+            "overall_summary": f"{len(groups)} clusters",
+        }
+
+
+class StubPipeline(AnalysisPipeline):
+    """Pipeline with the planner and analysis LLM calls replaced.
+
+    `analyze` returns the retrieved documents instead of themes so callers
+    can check exactly which evidence each request saw.
+    """
+
+    def plan(self, query: str) -> Dict[str, Any]:
+        return stub_plan(query)
+
+    def analyze(self, ingestion_output: Dict[str, Any]) -> Dict[str, Any]:
+        documents = retrieve_context(
+            " ".join(ingestion_output.get("query", [])),
+            store=self.ingestion_service.vector_store,
+            where=request_scope(ingestion_output),
+        )
+        return {"post_ids": request_post_ids(ingestion_output), "documents": documents}
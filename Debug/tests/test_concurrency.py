@@ -0,0 +1,87 @@
+"""
+Overlapping pipeline runs sharing one VectorStore.
+
+Every stub document starts with "[<post id>]" and FakeLLM names map
+themes after the first word of each line, so with map-reduce analysis
+each result theme is one post and its evidence_count is the number of
+that post's documents the request retrieved.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from main import RedditIngestionService
+from pipeline import AnalysisPipeline
+from stubs import FakeLLM, HashingVectorStore, StubRedditClient, stable_id, stub_plan
+
+REQUESTS = 8
+
+
+class OfflinePipeline(AnalysisPipeline):
+    def plan(self, query):
+        return stub_plan(query)
+
+
+class BlockingStore(HashingVectorStore):
+    """Embedding calls for more than one text wait until `release` is set."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.embedding = threading.Event()
+        self.release = threading.Event()
+
+    def _embed_remote(self, texts):
+        if len(texts) > 1:
+            self.embedding.set()
+            self.release.wait(timeout=5)
+        return super()._embed_remote(texts)
+
+
+def expected_post_ids(query):
+    plan = stub_plan(query)
+    return {
+        stable_id(subreddit, keyword, str(i))
+        for subreddit in plan["target_subreddits"]
+        for keyword in plan["keywords"]
+        for i in range(plan["posts_limit_per_subreddit"])
+    }
+
+
+def test_overlapping_runs_see_only_and_all_their_own_documents():
+    # Small batches and slow embeddings keep flushes from different requests overlapping
+    store = HashingVectorStore(backend="numpy", buffer_size=10, latency=0.005)
+    pipeline = OfflinePipeline(
+        RedditIngestionService(reddit_client=StubRedditClient(latency=0.01), vector_store=store),
+        analysis_mode="map_reduce",
+        llm=FakeLLM(),
+    )
+    queries = [f"topic{i}" for i in range(REQUESTS)]
+    with ThreadPoolExecutor(max_workers=REQUESTS) as pool:
+        results = dict(zip(queries, pool.map(pipeline.run, queries)))
+
+    for query, result in results.items():
+        own = expected_post_ids(query)
+        counts = {theme["theme"][1:-1]: theme["evidence_count"] for theme in result["themes"]}
+
+        assert set(counts) <= own, f"{query} saw other requests' posts: {set(counts) - own}"
+        for post_id in own:
+            stored = len(store.fetch(post_ids=[post_id])["ids"])
+            assert stored > 0
+            assert counts.get(post_id) == stored, f"{query} retrieved {counts.get(post_id)} of {stored} documents for {post_id}"
+
+
+def test_search_waits_for_a_flush_already_in_progress():
+    store = BlockingStore(backend="numpy", buffer_size=1000)
+    store.add_many(
+        ["alpha one", "alpha two"], [{"post_id": "a"}, {"post_id": "a"}], ids=["comment:1", "comment:2"]
+    )
+
+    # Another request's flush picks up request A's documents and stalls in embedding
+    other = threading.Thread(target=store.flush)
+    other.start()
+    assert store.embedding.wait(timeout=5)
+
+    threading.Timer(0.2, store.release.set).start()
+    result = store.search("alpha", k=5, post_ids=["a"])
+    other.join()
+
+    assert sorted(result["ids"][0]) == ["comment:1", "comment:2"]
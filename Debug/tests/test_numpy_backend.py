@@ -0,0 +1,82 @@
+"""NumpyBackend persistence: snapshot, append log and replay on reopen."""
+import os
+
+import numpy as np
+
+from stubs import HashingVectorStore
+from vector_backends import NumpyBackend
+
+
+def contents(backend):
+    stored = backend.get(include=["documents", "metadatas", "embeddings"])
+    return sorted(
+        (doc_id, doc, str(meta), tuple(np.round(vector, 5)))
+        for doc_id, doc, meta, vector in zip(
+            stored["ids"], stored["documents"], stored["metadatas"], stored["embeddings"]
+        )
+    )
+
+
+def test_changes_survive_reopen_through_the_log(tmp_path):
+    rng = np.random.default_rng(0)
+    backend = NumpyBackend(str(tmp_path))
+    backend.upsert([f"d{i}" for i in range(50)], [f"text {i}" for i in range(50)],
+                   rng.standard_normal((50, 8)), [{"n": i} for i in range(50)])
+    backend.persist()
+
+    backend.upsert(["d1", "new"], ["edited", "added"], rng.standard_normal((2, 8)), [{"n": -1}, {"n": 99}])
+    backend.update(["d2"], [{"n": "updated"}])
+    backend.delete(["d3", "d49"])
+    backend.persist()
+
+    # Small changes are appended, not written as a new snapshot
+    assert any(name.endswith(".jsonl") for name in os.listdir(tmp_path))
+    assert contents(NumpyBackend(str(tmp_path))) == contents(backend)
+
+
+def test_log_is_folded_into_a_new_snapshot(tmp_path):
+    rng = np.random.default_rng(1)
+    backend = NumpyBackend(str(tmp_path))
+    backend.upsert(["a", "b"], ["x", "y"], rng.standard_normal((2, 8)), [{}, {}])
+    backend.persist()
+
+    for i in range(5):
+        backend.upsert([f"z{i}"], ["z"], rng.standard_normal((1, 8)), [{}])
+        backend.persist()
+
+    assert backend._log_entries <= backend._snapshot_rows
+    assert contents(NumpyBackend(str(tmp_path))) == contents(backend)
+
+
+def test_torn_log_tail_is_dropped(tmp_path):
+    rng = np.random.default_rng(2)
+    backend = NumpyBackend(str(tmp_path))
+    backend.upsert(["a", "b", "c"], ["x", "y", "z"], rng.standard_normal((3, 8)), [{}, {}, {}])
+    backend.persist()
+    backend.upsert(["d"], ["w"], rng.standard_normal((1, 8)), [{}])
+    backend.persist()
+
+    log_path, vectors_path = backend._log_paths(str(tmp_path), backend._generation)
+    with open(log_path, "a", encoding="utf-8") as f:
+        f.write('{"op": "upsert", "id": "hal')
+    with open(vectors_path, "ab") as f:
+        f.write(b"\0\0")
+
+    reopened = NumpyBackend(str(tmp_path))
+    assert contents(reopened) == contents(backend)
+    assert contents(NumpyBackend(str(tmp_path))) == contents(backend)
+
+
+def test_compact_deletes_are_persisted(tmp_path):
+    store = HashingVectorStore(backend="numpy", persistent=True, persist_directory=str(tmp_path))
+    vectors = store.embed_many(["same text"] * 3)
+    store.backend.upsert(
+        ids=["1b9d6bcd-uuid-a", "2c9d6bcd-uuid-b", "comment:c1"],
+        documents=["same text"] * 3,
+        embeddings=vectors,
+        metadatas=[{"type": "comment"}, {"type": "comment"}, {"type": "comment", "post_id": "p1"}],
+    )
+    store.backend.persist()
+
+    assert store.compact() == 2
+    assert NumpyBackend(str(tmp_path)).get()["ids"] == ["comment:c1"]
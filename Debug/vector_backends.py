@@ -0,0 +1,461 @@
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class VectorBackend:
+    """
+    Storage and nearest-neighbour search behind VectorStore.
+
+    The interface is the subset of a Chroma collection VectorStore uses,
+    so results keep Chroma's shape ({"ids": [[...]], "documents": [[...]], ...}
+    for queries, flat lists for get).
+    """
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def get(self, ids: List[str] = None, include: List[str] = None,
+            limit: int = None, offset: int = 0, where: dict = None) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def upsert(self, ids: List[str], documents: List[str],
+               embeddings: List[List[float]], metadatas: List[dict]) -> None:
+        raise NotImplementedError
+
+    def update(self, ids: List[str], metadatas: List[dict]) -> None:
+        raise NotImplementedError
+
+    def delete(self, ids: List[str]) -> None:
+        raise NotImplementedError
+
+    def query(self, query_embeddings: List[List[float]], n_results: int = 8,
+              where: dict = None, include: List[str] = None) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def persist(self) -> None:
+        """Write pending state to disk; a no-op for self-persisting backends."""
+
+
+class ChromaBackend(VectorBackend):
+    """Chroma collection with an HNSW index; the backend for large corpora."""
+
+    def __init__(self, collection_name: str, persist_directory: str = None):
+        """
+        Args:
+            collection_name: Chroma collection to open or create
+            persist_directory: Chroma data directory, or None for an in-memory client
+        """
+        # Imported here so the NumPy backend never pays chromadb's start-up cost
+        import chromadb
+
+        if persist_directory:
+            # Reopens the existing collection and HNSW index on warm start
+            self.chroma = chromadb.PersistentClient(path=persist_directory)
+        else:
+            self.chroma = chromadb.EphemeralClient()
+        self.collection = self.chroma.get_or_create_collection(name=collection_name)
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def get(self, ids=None, include=None, limit=None, offset=0, where=None):
+        return self.collection.get(
+            ids=ids, include=include or ["documents", "metadatas"], limit=limit, offset=offset, where=where
+        )
+
+    def upsert(self, ids, documents, embeddings, metadatas):
+        self.collection.upsert(ids=ids, documents=documents, embeddings=embeddings, metadatas=metadatas)
+
+    def update(self, ids, metadatas):
+        self.collection.update(ids=ids, metadatas=metadatas)
+
+    def delete(self, ids):
+        self.collection.delete(ids=ids)
+
+    def query(self, query_embeddings, n_results=8, where=None, include=None):
+        return self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where,
+            include=include or ["documents", "metadatas", "distances"],
+        )
+
+
+# ---------------- NUMPY BACKEND ---------------- #
+
+_COMPARATORS = {
+    "$eq": lambda a, b: a == b,
+    "$ne": lambda a, b: a != b,
+    "$gt": lambda a, b: a is not None and a > b,
+    "$gte": lambda a, b: a is not None and a >= b,
+    "$lt": lambda a, b: a is not None and a < b,
+    "$lte": lambda a, b: a is not None and a <= b,
+    "$in": lambda a, b: a in b,
+    "$nin": lambda a, b: a not in b,
+}
+
+
+def matches_where(metadata: Optional[dict], where: Optional[dict]) -> bool:
+    """Evaluate a Chroma-style `where` filter against one metadata dict."""
+    if not where:
+        return True
+    metadata = metadata or {}
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, c) for c in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, c) for c in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for op, operand in condition.items():
+                if not _COMPARATORS[op](value, operand):
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+class NumpyBackend(VectorBackend):
+    """
+    Exact brute-force search over an in-memory float32 matrix.
+
+    Vectors are L2-normalized on insert into one contiguous array, so a
+    query is a single matrix-vector product plus argpartition for the top
+    k. Distances are cosine distances (1 - cosine similarity). With no
+    index to build and no chromadb import, this beats Chroma for corpora
+    up to a few thousand vectors (see `benchmark.py backends`).
+
+    With a persist_directory the matrix is saved as vectors.npy next to
+    a JSON file of ids, documents and metadata, and memory-mapped on load.
+    persist() only appends the changes since the last call to a log
+    (JSON lines plus raw float32 rows) that load() replays; the snapshot
+    is rewritten once the log holds more entries than the snapshot has
+    rows, so a flush costs O(changes) amortized rather than O(corpus).
+    """
+
+    VECTORS_FILE = "vectors.npy"
+    RECORDS_FILE = "records.json"
+    LOG_FILE = "log.{generation}.jsonl"
+    LOG_VECTORS_FILE = "log.{generation}.f32"
+
+    def __init__(self, persist_directory: str = None):
+        """
+        Args:
+            persist_directory: Directory for vectors.npy / records.json, or None for in-memory only
+        """
+        self.persist_directory = persist_directory
+        self._lock = threading.RLock()
+
+        self._ids: List[str] = []
+        self._documents: List[str] = []
+        self._metadatas: List[dict] = []
+        self._rows: Dict[str, int] = {}
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+
+        # Changes not yet on disk, as ("upsert", id, document, metadata, vector),
+        # ("update", id, metadata) or ("delete", id)
+        self._pending: List[tuple] = []
+        self._generation = 0
+        self._snapshot_rows = 0
+        self._log_entries = 0
+        self._log_vectors = 0
+
+        if persist_directory and os.path.exists(os.path.join(persist_directory, self.RECORDS_FILE)):
+            self.load(persist_directory)
+
+    # ---- storage ---- #
+
+    def _ensure_capacity(self, rows: int, dim: int) -> None:
+        """Grow the matrix geometrically so inserts are amortized O(1)."""
+        capacity, current_dim = self._vectors.shape
+        if current_dim not in (0, dim) and self._ids:
+            raise ValueError(f"Embedding dimension {dim} does not match index dimension {current_dim}")
+        if rows <= capacity and current_dim == dim and not isinstance(self._vectors, np.memmap):
+            return
+
+        grown = np.zeros((max(rows, 2 * capacity, 64), dim), dtype=np.float32)
+        used = len(self._ids)
+        if used:
+            grown[:used] = self._vectors[:used]
+        self._vectors = grown
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    def get(self, ids=None, include=None, limit=None, offset=0, where=None):
+        include = include or ["documents", "metadatas"]
+        with self._lock:
+            if ids is None:
+                rows = range(len(self._ids))
+            else:
+                rows = [self._rows[i] for i in ids if i in self._rows]
+            if where:
+                rows = [r for r in rows if matches_where(self._metadatas[r], where)]
+            rows = list(rows)[offset:None if limit is None else offset + limit]
+            return self._records(rows, include)
+
+    def _records(self, rows: List[int], include: List[str]) -> Dict[str, Any]:
+        result = {"ids": [self._ids[r] for r in rows]}
+        if "documents" in include:
+            result["documents"] = [self._documents[r] for r in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [self._metadatas[r] for r in rows]
+        if "embeddings" in include:
+            result["embeddings"] = np.array(self._vectors[rows]) if rows else np.empty((0, 0), dtype=np.float32)
+        return result
+
+    def upsert(self, ids, documents, embeddings, metadatas):
+        vectors = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            self._upsert_rows(ids, documents, vectors, metadatas)
+            if self.persist_directory:
+                self._pending.extend(
+                    ("upsert", *record) for record in zip(ids, documents, metadatas, vectors)
+                )
+
+    def _upsert_rows(self, ids, documents, vectors: np.ndarray, metadatas) -> None:
+        with self._lock:
+            new = [i for i in dict.fromkeys(ids) if i not in self._rows]
+            self._ensure_capacity(len(self._ids) + len(new), vectors.shape[1])
+            for doc_id, document, vector, metadata in zip(ids, documents, vectors, metadatas):
+                row = self._rows.get(doc_id)
+                if row is None:
+                    row = len(self._ids)
+                    self._rows[doc_id] = row
+                    self._ids.append(doc_id)
+                    self._documents.append(document)
+                    self._metadatas.append(metadata)
+                else:
+                    self._documents[row] = document
+                    self._metadatas[row] = metadata
+                self._vectors[row] = vector
+
+    def update(self, ids, metadatas):
+        with self._lock:
+            for doc_id, metadata in zip(ids, metadatas):
+                if doc_id in self._rows:
+                    self._metadatas[self._rows[doc_id]] = metadata
+                    if self.persist_directory:
+                        self._pending.append(("update", doc_id, metadata))
+
+    def delete(self, ids):
+        with self._lock:
+            self._delete_rows(ids)
+            if self.persist_directory:
+                self._pending.extend(("delete", doc_id) for doc_id in ids)
+
+    def _delete_rows(self, ids) -> None:
+        with self._lock:
+            # Copy out of a read-only memmap before moving rows around
+            self._ensure_capacity(len(self._ids), self._vectors.shape[1])
+            for doc_id in ids:
+                row = self._rows.pop(doc_id, None)
+                if row is None:
+                    continue
+                last = len(self._ids) - 1
+                if row != last:
+                    # Move the last row into the hole to keep the matrix contiguous
+                    moved = self._ids[last]
+                    self._ids[row] = moved
+                    self._documents[row] = self._documents[last]
+                    self._metadatas[row] = self._metadatas[last]
+                    self._vectors[row] = self._vectors[last]
+                    self._rows[moved] = row
+                self._ids.pop()
+                self._documents.pop()
+                self._metadatas.pop()
+
+    # ---- search ---- #
+
+    def query(self, query_embeddings, n_results=8, where=None, include=None):
+        include = include or ["documents", "metadatas", "distances"]
+        queries = self._normalize(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+
+        with self._lock:
+            used = len(self._ids)
+            if where:
+                candidates = np.fromiter(
+                    (r for r in range(used) if matches_where(self._metadatas[r], where)), dtype=np.int64
+                )
+                matrix = self._vectors[candidates]
+            else:
+                candidates = None
+                matrix = self._vectors[:used]
+
+            result = {key: [] for key in ["ids", *include]}
+            scores = matrix @ queries.T if len(matrix) else np.empty((0, len(queries)), dtype=np.float32)
+            k = min(n_results, len(matrix))
+
+            for column in range(len(queries)):
+                sims = scores[:, column]
+                if k < len(sims):
+                    top = np.argpartition(-sims, k - 1)[:k]
+                else:
+                    top = np.arange(len(sims))
+                top = top[np.argsort(-sims[top], kind="stable")]
+
+                rows = (candidates[top] if candidates is not None else top).tolist()
+                records = self._records(rows, include)
+                for key in result:
+                    if key == "distances":
+                        result[key].append((1.0 - sims[top]).tolist())
+                    else:
+                        result[key].append(records[key])
+            return result
+
+    # ---- persistence ---- #
+
+    def persist(self) -> None:
+        """Append changes since the last call to the log, or rewrite the snapshot."""
+        with self._lock:
+            if not self.persist_directory or not self._pending:
+                return
+            if (
+                not self._snapshot_rows
+                or self._log_entries + len(self._pending) > self._snapshot_rows
+                or self._vectors.shape[1] == 0
+            ):
+                self.save(self.persist_directory)
+            else:
+                self._append_log(self.persist_directory)
+
+    def _log_paths(self, directory: str, generation: int) -> Tuple[str, str]:
+        return (
+            os.path.join(directory, self.LOG_FILE.format(generation=generation)),
+            os.path.join(directory, self.LOG_VECTORS_FILE.format(generation=generation)),
+        )
+
+    def _append_log(self, directory: str) -> None:
+        log_path, vectors_path = self._log_paths(directory, self._generation)
+        lines, vectors = [], []
+        for op, doc_id, *rest in self._pending:
+            entry = {"op": op, "id": doc_id}
+            if op == "upsert":
+                document, metadata, vector = rest
+                entry.update(document=document, metadata=metadata, vector=self._log_vectors + len(vectors))
+                vectors.append(vector)
+            elif op == "update":
+                entry["metadata"] = rest[0]
+            lines.append(json.dumps(entry, ensure_ascii=False) + "\n")
+
+        # Vectors first: a log line is only replayed once its vector is on disk
+        if vectors:
+            with open(vectors_path, "ab") as f:
+                f.write(np.asarray(vectors, dtype=np.float32).tobytes())
+        with open(log_path, "a", encoding="utf-8") as f:
+            f.writelines(lines)
+
+        self._log_vectors += len(vectors)
+        self._log_entries += len(lines)
+        self._pending = []
+
+    def save(self, directory: str) -> None:
+        """Write vectors.npy and records.json atomically into `directory` and drop the log."""
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            generation = self._generation + 1
+            vectors_tmp = os.path.join(directory, self.VECTORS_FILE + ".tmp")
+            records_tmp = os.path.join(directory, self.RECORDS_FILE + ".tmp")
+            with open(vectors_tmp, "wb") as f:
+                np.save(f, np.ascontiguousarray(self._vectors[:len(self._ids)]))
+            with open(records_tmp, "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "generation": generation,
+                        "ids": self._ids,
+                        "documents": self._documents,
+                        "metadatas": self._metadatas,
+                    },
+                    f, ensure_ascii=False
+                )
+            os.replace(vectors_tmp, os.path.join(directory, self.VECTORS_FILE))
+            # The records file names the log generation, so replacing it last
+            # switches to the new snapshot and its (empty) log at once
+            os.replace(records_tmp, os.path.join(directory, self.RECORDS_FILE))
+
+            for path in self._log_paths(directory, self._generation):
+                if os.path.exists(path):
+                    os.remove(path)
+
+            self._generation = generation
+            self._snapshot_rows = len(self._ids)
+            self._log_entries = self._log_vectors = 0
+            self._pending = []
+
+    def load(self, directory: str) -> None:
+        """Load a saved index, memory-mapping the vectors read-only, and replay its log."""
+        with open(os.path.join(directory, self.RECORDS_FILE), "r", encoding="utf-8") as f:
+            records = json.load(f)
+        vectors = np.load(os.path.join(directory, self.VECTORS_FILE), mmap_mode="r")
+
+        with self._lock:
+            self._ids = records["ids"]
+            self._documents = records["documents"]
+            self._metadatas = records["metadatas"]
+            self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+            # Copied into a writable array on the first insert or delete
+            self._vectors = vectors if len(vectors) else np.empty((0, 0), dtype=np.float32)
+            self._generation = records.get("generation", 0)
+            self._snapshot_rows = len(self._ids)
+            self._log_entries = self._log_vectors = 0
+            self._pending = []
+            self._replay_log(directory)
+
+    def _replay_log(self, directory: str) -> None:
+        log_path, vectors_path = self._log_paths(directory, self._generation)
+        if not os.path.exists(log_path) or not self._vectors.shape[1]:
+            return
+
+        dim = self._vectors.shape[1]
+        logged = np.fromfile(vectors_path, dtype=np.float32) if os.path.exists(vectors_path) else np.empty(0)
+        torn = len(logged) % dim != 0
+        logged = logged[:len(logged) // dim * dim].reshape(-1, dim)
+
+        with open(log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Torn final line from an interrupted append
+                    torn = True
+                    break
+                if entry["op"] == "upsert":
+                    if entry["vector"] >= len(logged):
+                        torn = True
+                        break
+                    self._upsert_rows(
+                        [entry["id"]], [entry["document"]], logged[entry["vector"]:entry["vector"] + 1], [entry["metadata"]]
+                    )
+                elif entry["op"] == "update":
+                    if entry["id"] in self._rows:
+                        self._metadatas[self._rows[entry["id"]]] = entry["metadata"]
+                else:
+                    self._delete_rows([entry["id"]])
+                self._log_entries += 1
+
+        self._log_vectors = len(logged)
+        logger.info(f"Replayed {self._log_entries} logged changes from {log_path}")
+        if torn:
+            # Appending after a partial write would misalign the log; start a clean snapshot
+            self.save(directory)
+
+
+BACKENDS = {
+    "chroma": ChromaBackend,
+    "numpy": NumpyBackend,
+}
@@ -1,41 +1,458 @@
-import chromadb
-from chromadb.config import Settings
-from google import genai
+import hashlib
+import logging
 import os
-import uuid
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from embedding_cache import EmbeddingCache, normalize_text
+from llm_gateway import get_gateway
+from vector_backends import BACKENDS, VectorBackend
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "models/embedding-001"
+
+# Gemini accepts at most 100 contents per embed_content call
+EMBED_BATCH_SIZE = 100
+
+# Default data directory per backend; overridden by $CHROMA_PATH / $NUMPY_INDEX_PATH
+DEFAULT_PERSIST_DIRECTORIES = {
+    "chroma": ("CHROMA_PATH", "./chroma_db"),
+    "numpy": ("NUMPY_INDEX_PATH", "./numpy_index"),
+}
+COLLECTION_NAME = "reddit_comments"
+
+
+def build_where(
+    where: Dict[str, Any] = None,
+    post_ids: Iterable[str] = None,
+    subreddits: Iterable[str] = None,
+    doc_type: str = None,
+    min_score: int = None,
+    since_utc: int = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Combine metadata filters into one Chroma `where` clause.
+
+    Args:
+        where: Raw Chroma filter to include as-is
+        post_ids: Only documents from these posts (a request's slice)
+        subreddits: Only documents from these subreddits (case-insensitive)
+        doc_type: "post" or "comment"
+        min_score: Minimum Reddit score
+        since_utc: Only posts created at or after this Unix time
+
+    Returns:
+        Chroma filter, or None when no filter applies
+    """
+    clauses = [where] if where else []
+    if post_ids is not None:
+        clauses.append({"post_id": {"$in": list(post_ids)}})
+    if subreddits:
+        clauses.append({"subreddit": {"$in": [s.lower() for s in subreddits]}})
+    if doc_type:
+        clauses.append({"type": doc_type})
+    if min_score is not None:
+        clauses.append({"score": {"$gte": min_score}})
+    if since_utc is not None:
+        clauses.append({"created_utc": {"$gte": since_utc}})
+
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def mmr_select(
+    query_vector: List[float],
+    doc_vectors: List[List[float]],
+    k: int,
+    lambda_mult: float = 0.5,
+) -> List[int]:
+    """
+    Pick `k` documents by maximal marginal relevance.
+
+    Each step takes the candidate maximizing
+    lambda * sim(query, doc) - (1 - lambda) * max sim(doc, already picked),
+    so near-duplicates of a picked document drop down the ranking.
+
+    Args:
+        query_vector: Query embedding
+        doc_vectors: Candidate embeddings, in relevance order
+        k: Number of documents to pick
+        lambda_mult: 1.0 ranks by relevance only, 0.0 by diversity only
+
+    Returns:
+        Indices into doc_vectors in pick order
+    """
+    docs = np.asarray(doc_vectors, dtype=np.float32)
+    if docs.size == 0 or k <= 0:
+        return []
+
+    docs = docs / np.maximum(np.linalg.norm(docs, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_vector, dtype=np.float32)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+    relevance = docs @ query
+    pairwise = docs @ docs.T
+    redundancy = np.full(len(docs), -np.inf, dtype=np.float32)
+    available = np.ones(len(docs), dtype=bool)
+
+    picked = []
+    for _ in range(min(k, len(docs))):
+        penalty = np.where(np.isfinite(redundancy), redundancy, 0.0)
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * penalty
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        picked.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, pairwise[best])
+
+    return picked
 
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
 
 class VectorStore:
-    def __init__(self):
-        self.chroma = chromadb.Client(
-            Settings(persist_directory="./chroma_db")
-        )
-        self.collection = self.chroma.get_or_create_collection(
-            name="reddit_comments"
+    def __init__(
+        self,
+        buffer_size: int = EMBED_BATCH_SIZE,
+        flush_interval: float = 2.0,
+        embedding_cache: EmbeddingCache = None,
+        use_embedding_cache: bool = True,
+        persist_directory: str = None,
+        persistent: bool = True,
+        backend: str = None,
+    ):
+        """
+        Args:
+            buffer_size: Buffered documents that trigger a flush
+            flush_interval: Seconds after which a non-empty buffer is flushed on the next add
+            embedding_cache: Vector cache (default: SQLite file at $EMBEDDING_CACHE_PATH)
+            use_embedding_cache: Set False to always call the embedding API
+            persist_directory: Data directory (default: $CHROMA_PATH or ./chroma_db for
+                chroma, $NUMPY_INDEX_PATH or ./numpy_index for numpy)
+            persistent: Set False for a throwaway in-memory store
+            backend: "chroma" (HNSW, large corpora) or "numpy" (exact, small
+                corpora); default $VECTOR_BACKEND or "chroma"
+        """
+        if embedding_cache is None and use_embedding_cache:
+            embedding_cache = EmbeddingCache(
+                os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.sqlite")
+            )
+        self.embedding_cache = embedding_cache
+
+        self.backend_name = backend or os.getenv("VECTOR_BACKEND", "chroma")
+        if self.backend_name not in BACKENDS:
+            raise ValueError(f"Unknown vector backend {self.backend_name!r}, expected one of {sorted(BACKENDS)}")
+
+        self.persist_directory = None
+        if persistent:
+            env_var, default = DEFAULT_PERSIST_DIRECTORIES[self.backend_name]
+            self.persist_directory = persist_directory or os.getenv(env_var, default)
+
+        if self.backend_name == "chroma":
+            self.backend: VectorBackend = BACKENDS["chroma"](COLLECTION_NAME, self.persist_directory)
+        else:
+            self.backend = BACKENDS[self.backend_name](self.persist_directory)
+        logger.info(
+            f"Opened {self.backend_name} vector store {self.persist_directory or '(in-memory)'} "
+            f"with {self.backend.count()} documents"
         )
 
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._buffer_started: Optional[float] = None
+        self._lock = threading.Lock()
+        # Held from buffer swap through upsert, so a returning flush()
+        # means everything buffered before the call is stored
+        self._flush_lock = threading.Lock()
+
     def embed(self, text: str):
-        res = client.models.embed_content(
-            model="models/embedding-001",
-            content=text
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts, calling the API only for texts missing from the cache."""
+        if self.embedding_cache is None:
+            return self._embed_remote(texts)
+
+        vectors = self.embedding_cache.get_many(EMBEDDING_MODEL, texts)
+        missing = [i for i, v in enumerate(vectors) if v is None]
+
+        if missing:
+            fetched = self._embed_remote([texts[i] for i in missing])
+            self.embedding_cache.put_many(EMBEDDING_MODEL, [texts[i] for i in missing], fetched)
+            for i, vector in zip(missing, fetched):
+                vectors[i] = vector
+
+        return vectors
+
+    def _embed_remote(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts with one gateway call per EMBED_BATCH_SIZE texts."""
+        vectors = []
+        for start in range(0, len(texts), EMBED_BATCH_SIZE):
+            vectors.extend(get_gateway().embed(
+                texts[start:start + EMBED_BATCH_SIZE],
+                model=EMBEDDING_MODEL
+            ))
+        return vectors
+
+    @staticmethod
+    def content_id(text: str) -> str:
+        """Deterministic id for documents without a Reddit id."""
+        digest = hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"doc:{digest}"
+
+    def add(self, text: str, metadata: dict, doc_id: str = None):
+        self.add_many([text], [metadata], ids=[doc_id])
+
+    def add_many(self, texts: List[str], metadatas: List[dict], ids: List[Optional[str]] = None):
+        """
+        Buffer documents for batched embedding and upsert.
+
+        Documents are keyed by `ids` (e.g. "comment:<reddit id>"), falling
+        back to a content hash, so adding the same document twice keeps
+        one copy. The buffer is flushed once it holds buffer_size
+        documents or its oldest document is older than flush_interval.
+        search() and flush() write out anything still pending.
+        """
+        ids = ids or [None] * len(texts)
+
+        with self._lock:
+            for text, metadata, doc_id in zip(texts, metadatas, ids):
+                if text.strip():
+                    self._buffer.append((doc_id or self.content_id(text), text, metadata))
+
+            if self._buffer and self._buffer_started is None:
+                self._buffer_started = time.monotonic()
+
+            due = len(self._buffer) >= self.buffer_size or (
+                self._buffer_started is not None
+                and time.monotonic() - self._buffer_started >= self.flush_interval
+            )
+
+        if due:
+            self.flush()
+
+    def flush(self):
+        """
+        Upsert every buffered document in batches.
+
+        Documents already stored with the same text and metadata are
+        skipped; changed metadata alone is updated without re-embedding.
+        Only new or edited texts are embedded. Concurrent calls run one
+        at a time; if embedding or upsert fails, the documents go back
+        into the buffer for the next flush.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._buffer = self._buffer, []
+                self._buffer_started = None
+
+            try:
+                self._upsert(pending)
+            except Exception:
+                with self._lock:
+                    # Ahead of anything buffered since, so later writes still win
+                    self._buffer = pending + self._buffer
+                    self._buffer_started = time.monotonic()
+                raise
+
+    def _upsert(self, pending: List[tuple]) -> None:
+        # Last write wins for ids repeated within the buffer
+        pending = list({doc_id: (doc_id, text, meta) for doc_id, text, meta in pending}.values())
+
+        skipped = updated = embedded = 0
+        for start in range(0, len(pending), EMBED_BATCH_SIZE):
+            batch = pending[start:start + EMBED_BATCH_SIZE]
+
+            stored = self.backend.get(
+                ids=[doc_id for doc_id, _, _ in batch],
+                include=["documents", "metadatas"]
+            )
+            existing = {
+                doc_id: (doc, meta)
+                for doc_id, doc, meta in zip(stored["ids"], stored["documents"], stored["metadatas"])
+            }
+
+            to_embed, to_update = [], []
+            for doc_id, text, metadata in batch:
+                if doc_id not in existing or existing[doc_id][0] != text:
+                    to_embed.append((doc_id, text, metadata))
+                elif existing[doc_id][1] != metadata:
+                    to_update.append((doc_id, metadata))
+                else:
+                    skipped += 1
+
+            if to_update:
+                self.backend.update(
+                    ids=[doc_id for doc_id, _ in to_update],
+                    metadatas=[metadata for _, metadata in to_update]
+                )
+                updated += len(to_update)
+
+            if to_embed:
+                texts = [text for _, text, _ in to_embed]
+                self.backend.upsert(
+                    ids=[doc_id for doc_id, _, _ in to_embed],
+                    documents=texts,
+                    embeddings=self.embed_many(texts),
+                    metadatas=[metadata for _, _, metadata in to_embed]
+                )
+                embedded += len(to_embed)
+
+        if pending:
+            self.backend.persist()
+            logger.info(f"Upserted {embedded} documents, updated {updated}, skipped {skipped} unchanged")
+
+    def compact(self, page_size: int = 1000) -> int:
+        """
+        Remove duplicate documents left by earlier random-id inserts.
+
+        Documents with the same text and post_id are duplicates; one copy is
+        kept, preferring a deterministic id over a legacy uuid. Legacy rows
+        stored before post_id metadata match on text alone and are deleted
+        when a deterministic-id copy of the same text exists.
+
+        Returns:
+            Number of documents deleted
+        """
+        self.flush()
+
+        kept = {}
+        unscoped = {}
+        deterministic_texts = set()
+        duplicates = []
+        offset = 0
+        while True:
+            page = self.backend.get(
+                include=["documents", "metadatas"], limit=page_size, offset=offset
+            )
+            if not page["ids"]:
+                break
+
+            for doc_id, doc, meta in zip(page["ids"], page["documents"], page["metadatas"]):
+                post_id = (meta or {}).get("post_id")
+                if ":" in doc_id:
+                    deterministic_texts.add(doc)
+
+                group, key = (kept, (doc, post_id)) if post_id else (unscoped, doc)
+                current = group.get(key)
+                if current is None:
+                    group[key] = doc_id
+                elif ":" in doc_id and ":" not in current:
+                    duplicates.append(current)
+                    group[key] = doc_id
+                else:
+                    duplicates.append(doc_id)
+
+            offset += page_size
+
+        duplicates.extend(
+            doc_id for doc, doc_id in unscoped.items()
+            if ":" not in doc_id and doc in deterministic_texts
+        )
+
+        for start in range(0, len(duplicates), page_size):
+            self.backend.delete(ids=duplicates[start:start + page_size])
+        if duplicates:
+            self.backend.persist()
+
+        logger.info(f"Compaction removed {len(duplicates)} duplicate documents")
+        return len(duplicates)
+
+    def search(self, query: str, k: int = 8, where: dict = None, **filters):
+        """
+        Nearest documents to `query`, optionally restricted by metadata.
+
+        `filters` are build_where() keywords (post_ids, subreddits,
+        doc_type, min_score, since_utc) and are ANDed with `where`.
+        """
+        self.flush()
+        q_embed = self.embed(query)
+        return self.backend.query(
+            query_embeddings=[q_embed],
+            n_results=k,
+            where=build_where(where, **filters)
         )
-        return res["embedding"]
 
-    def add(self, text: str, metadata: dict):
-        if not text.strip():
-            return
+    def fetch(self, where: dict = None, limit: int = None, **filters):
+        """
+        All documents matching the filters, with their stored embeddings.
 
-        self.collection.add(
-            ids=[str(uuid.uuid4())],
-            documents=[text],
-            embeddings=[self.embed(text)],
-            metadatas=[metadata]
+        Takes the same filters as search(); returns flat lists under
+        "ids", "documents", "metadatas" and "embeddings".
+        """
+        self.flush()
+        return self.backend.get(
+            where=build_where(where, **filters),
+            limit=limit,
+            include=["documents", "metadatas", "embeddings"]
         )
 
-    def search(self, query: str, k: int = 8):
+    def search_mmr(
+        self,
+        query: str,
+        k: int = 8,
+        fetch_k: int = 40,
+        lambda_mult: float = 0.5,
+        where: dict = None,
+        **filters
+    ):
+        """
+        Diverse nearest documents: fetch `fetch_k` candidates, keep `k` by MMR.
+
+        Re-ranks with the embeddings the backend returns alongside the
+        candidates, so nothing is embedded twice. Takes the same filters as
+        search() and returns the same shape (one query row).
+        """
+        self.flush()
         q_embed = self.embed(query)
-        return self.collection.query(
+        results = self.backend.query(
             query_embeddings=[q_embed],
-            n_results=k
+            n_results=max(k, fetch_k),
+            where=build_where(where, **filters),
+            include=["documents", "metadatas", "distances", "embeddings"]
         )
+
+        order = mmr_select(q_embed, results["embeddings"][0], k, lambda_mult)
+        return {
+            key: [[results[key][0][i] for i in order]]
+            for key in ("ids", "documents", "metadatas", "distances")
+        }
+
+
+_shared_store: Optional[VectorStore] = None
+_shared_lock = threading.Lock()
+
+
+def get_vector_store() -> VectorStore:
+    """
+    Return the process-wide store, opening it on first use.
+
+    Ingestion and analysis both use this handle so they query the same
+    index.
+    """
+    global _shared_store
+    with _shared_lock:
+        if _shared_store is None:
+            _shared_store = VectorStore()
+        return _shared_store
+
+
+# ---------------- CLI ENTRY ---------------- #
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] != "compact":
+        print("Usage: python vector_store.py compact")
+        sys.exit(1)
+
+    logging.basicConfig(level=logging.INFO)
+    removed = get_vector_store().compact()
+    print(f"Removed {removed} duplicate documents")
+
+
+if __name__ == "__main__":
+    main()